@@ -0,0 +1,24 @@
+"""
+Atomic file writes: the content goes to a temporary file next to the target,
+which is renamed over it once complete, so a reader or a crash never sees a
+partial file.
+"""
+import os
+import threading
+
+def write_atomic(path, chunks):
+    """
+    Write text, or an iterable of text chunks, to path through one buffered
+    handle on a temporary file, then rename it to path
+    """
+    if isinstance(chunks, str):
+        chunks = (chunks,)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', buffering=1 << 16) as fil:
+            fil.writelines(chunks)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
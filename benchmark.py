@@ -0,0 +1,391 @@
+#!/usr/bin/python3
+"""
+Offline benchmark of grab_packages.py and package_comparison.py.
+A synthetic repository (N products x M packages, GA and Update channels, HTML
+listings and repodata) is generated with SRPMs of realistic content, served by
+a local HTTP server with configurable latency and bandwidth, then both scripts
+are run cold and warm against it. Wall time, cpu time, peak memory and number
+of forked processes of each run are reported, with the metrics summary the
+script wrote itself.
+"""
+import argparse
+import gzip
+import hashlib
+import http.server
+import io
+import json
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+import xml.sax.saxutils
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# rpm header tag data types, see rpmheader.py
+INT16, INT32, STRING, STRING_ARRAY, I18NSTRING = 3, 4, 6, 8, 9
+
+def header_structure(entries):
+    """
+    Build a header structure from (tag, type, value) entries
+    """
+    index = b''
+    store = b''
+    for tag, data_type, value in entries:
+        if data_type == INT32:
+            store += b'\0' * (-len(store) % 4)
+            offset, count = len(store), len(value)
+            store += struct.pack(f'>{count}I', *value)
+        elif data_type == INT16:
+            store += b'\0' * (-len(store) % 2)
+            offset, count = len(store), len(value)
+            store += struct.pack(f'>{count}H', *value)
+        elif data_type == STRING:
+            offset, count = len(store), 1
+            store += value.encode() + b'\0'
+        else:
+            offset, count = len(store), len(value)
+            store += b''.join(item.encode() + b'\0' for item in value)
+        index += struct.pack('>iIiI', tag, data_type, offset, count)
+    return b'\x8e\xad\xe8\x01\0\0\0\0' + struct.pack('>II', len(entries), len(store)) + index + store
+
+def cpio_newc(files):
+    """
+    newc cpio archive of {name: content}
+    """
+    out = bytearray()
+    for ino, (name, data) in enumerate(list(files.items()) + [('TRAILER!!!', b'')], 1):
+        mode = 0 if name == 'TRAILER!!!' else 0o100644
+        encoded = name.encode() + b'\0'
+        out += b'070701' + b''.join(b'%08X' % value for value in
+                                    (ino, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(encoded), 0))
+        out += encoded + b'\0' * (-(len(out) + len(encoded)) % 4)
+        out += data + b'\0' * (-(len(out) + len(data)) % 4)
+    return bytes(out)
+
+def cpio_stripped(files):
+    """
+    rpm stripped cpio archive of {name: content}: each member is only its
+    index in the header file list, the archive ends after the last file
+    """
+    out = bytearray()
+    for index, data in enumerate(files.values()):
+        out += b'07070X' + b'%08X' % index + b'\0\0'
+        out += data + b'\0' * (-len(data) % 4)
+    return bytes(out)
+
+def make_srpm(path, name, version, release, files, changelog, cpio=cpio_newc):
+    """
+    Write a source rpm: lead, signature, header with file list and
+    changelog, gzip cpio payload made by cpio
+    """
+    header = header_structure([
+        (1000, STRING, name), (1001, STRING, version), (1002, STRING, release),
+        (1004, I18NSTRING, [f"Synthetic package {name}"]),
+        (1020, STRING, f"https://example.org/{name}"),
+        (1028, INT32, [len(data) for data in files.values()]),
+        (1030, INT16, [0o100644] * len(files)),
+        (1035, STRING_ARRAY, [hashlib.sha256(data).hexdigest() for data in files.values()]),
+        (1080, INT32, [entry[0] for entry in changelog]),
+        (1081, STRING_ARRAY, [entry[1] for entry in changelog]),
+        (1082, STRING_ARRAY, [entry[2] for entry in changelog]),
+        (1116, INT32, [0] * len(files)),
+        (1117, STRING_ARRAY, list(files)),
+        (1118, STRING_ARRAY, ['']),
+        (5011, INT32, [8]),
+    ])
+    payload = gzip.compress(cpio(files), compresslevel=1)
+    signature = header_structure([(1000, INT32, [len(header) + len(payload)]),
+                                  (273, STRING, hashlib.sha256(header).hexdigest())])
+    signature += b'\0' * (-len(signature) % 8)
+    lead = b'\xed\xab\xee\xdb\x03\x00\x00\x01' + name.encode()[:65].ljust(88, b'\0')
+    with open(path, 'wb') as fil:
+        fil.write(lead + signature + header + payload)
+
+def package_content(name, version, release, entries, size):
+    """
+    Files and changelog of one version of a package, the same arguments
+    always give the same bytes. Changelog entry i is the same in every
+    version, newer versions just have more entries on top.
+    """
+    rng = random.Random(f"{name}-{version}-{release}")
+    changelog = []
+    for number in reversed(range(entries)):
+        entry_rng = random.Random(f"{name}#{number}")
+        text = '\n'.join(f"- {entry_rng.choice(['fix', 'update', 'backport', 'drop'])} "
+                         f"{entry_rng.choice(['build', 'crash', 'leak', 'docs'])} "
+                         f"bsc#{entry_rng.randint(1000000, 1300000)}"
+                         f"{' CVE-2024-%d' % entry_rng.randint(1000, 9999) if entry_rng.random() < 0.2 else ''}"
+                         for _ in range(entry_rng.randint(1, 6)))
+        changelog.append((1500000000 + number * 86400,
+                          f"Packager {number % 7} <packager{number % 7}@example.org>", text))
+    changes = ''.join(f"-------------------------------------------------------------------\n"
+                      f"{time.strftime('%a %b %d %H:%M:%S UTC %Y', time.gmtime(entry[0]))} - {entry[1]}\n\n"
+                      f"{entry[2]}\n\n" for entry in changelog)
+    files = {
+        f"{name}.spec": (f"Name: {name}\nVersion: {version}\nRelease: {release}\n"
+                         f"Summary: Synthetic package {name}\nLicense: MIT\n"
+                         f"Source0: {name}-{version}.tar.xz\n\n%description\nBenchmark.\n"
+                         + "\n".join(f"%patch -P {number} -p1" for number in range(rng.randint(0, 5)))
+                         ).encode(),
+        f"{name}.changes": changes.encode(),
+        f"{name}-{version}.tar.xz": rng.randbytes(max(1024, int(rng.lognormvariate(0, 0.5) * size))),
+    }
+    return files, changelog
+
+def primary_xml(packages):
+    """
+    primary.xml of (file name, name, version, release, size, sha256) entries
+    """
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<metadata xmlns="http://linux.duke.edu/metadata/common" packages="{len(packages)}">\n']
+    for file_name, name, version, release, size, checksum in packages:
+        out.append(f'<package type="rpm"><name>{xml.sax.saxutils.escape(name)}</name><arch>src</arch>'
+                   f'<version epoch="0" ver="{version}" rel="{release}"/>'
+                   f'<checksum type="sha256" pkgid="YES">{checksum}</checksum>'
+                   f'<size package="{size}"/><location href="src/{file_name}"/></package>\n')
+    out.append('</metadata>\n')
+    return ''.join(out).encode()
+
+def write_repodata(repo_dir, packages):
+    primary = gzip.compress(primary_xml(packages))
+    checksum = hashlib.sha256(primary).hexdigest()
+    os.makedirs(os.path.join(repo_dir, 'repodata'), exist_ok=True)
+    href = f"repodata/{checksum}-primary.xml.gz"
+    with open(os.path.join(repo_dir, href), 'wb') as fil:
+        fil.write(primary)
+    with open(os.path.join(repo_dir, 'repodata', 'repomd.xml'), 'w') as fil:
+        fil.write('<?xml version="1.0" encoding="UTF-8"?>\n<repomd xmlns="http://linux.duke.edu/metadata/repo">\n'
+                  f'<data type="primary"><checksum type="sha256">{checksum}</checksum>'
+                  f'<location href="{href}"/></data>\n</repomd>\n')
+
+def generate_tree(root, products, packages, size, entries):
+    """
+    <root>/<product>/{GA,Update}/src/*.src.rpm plus repodata. GA holds the
+    first release of each package, Update a newer one. Every third package
+    has a newer version in each product, the others are byte identical
+    across products, and a few packages are missing from some products.
+    """
+    names = [f"pkg{number:04d}" for number in range(packages)]
+    for product_index, product in enumerate(products):
+        for channel in ('GA', 'Update'):
+            src_dir = os.path.join(root, product, channel, 'src')
+            os.makedirs(src_dir, exist_ok=True)
+            repo_packages = []
+            for number, name in enumerate(names):
+                if (number + product_index) % 19 == 0:
+                    continue
+                minor = product_index if number % 3 == 0 else 0
+                version = f"{1 + number % 5}.{minor}.{number % 11}"
+                release = '1.1' if channel == 'GA' else f"{150000 + minor}.{number % 4 + 2}.1"
+                history = entries + minor * 3 + (5 if channel == 'Update' else 0)
+                files, changelog = package_content(name, version, release, history, size)
+                file_name = f"{name}-{version}-{release}.src.rpm"
+                path = os.path.join(src_dir, file_name)
+                make_srpm(path, name, version, release, files, changelog)
+                with open(path, 'rb') as fil:
+                    checksum = hashlib.sha256(fil.read()).hexdigest()
+                repo_packages.append((file_name, name, version, release, os.path.getsize(path), checksum))
+            write_repodata(os.path.join(root, product, channel), repo_packages)
+    return names
+
+class RepoHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Static file server with keep-alive, Range requests, a delay before each
+    response and a per connection bandwidth limit
+    """
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    # bytes per second and per connection, 0: no limit
+    bandwidth = 0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        RepoHandler.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = self.translate_path(self.path)
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+        with open(path, 'rb') as fil:
+            size = os.fstat(fil.fileno()).st_size
+            start = int(match[1])
+            end = min(int(match[2]) if match[2] else size - 1, size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            fil.seek(start)
+            data = fil.read(end - start + 1)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        return io.BytesIO(data)
+
+    def copyfile(self, source, outputfile):
+        while True:
+            data = source.read(16384)
+            if not data:
+                break
+            outputfile.write(data)
+            if self.bandwidth:
+                time.sleep(len(data) / self.bandwidth)
+
+def start_server(root, latency, bandwidth):
+    handler = type('Handler', (RepoHandler,), {'latency': latency, 'bandwidth': bandwidth})
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), lambda *args: handler(*args, directory=root))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# runs a script as __main__ and logs every process it (or its workers) creates,
+# through audit hooks: argv is <log file> <script> <script arguments>
+LAUNCHER = """
+import os, runpy, sys
+log_path = sys.argv[1]
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+def hook(event, args):
+    if event in ('os.fork', 'os.forkpty', 'os.system', 'os.posix_spawn', 'os.spawn', 'subprocess.Popen'):
+        with open(log_path, 'a') as log:
+            log.write(event + '\\n')
+sys.addaudithook(hook)
+runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+def run_script(name, args, workdir, metrics_file):
+    """
+    Run one of the scripts in workdir: returns wall time, cpu time, peak RSS
+    of the script and its workers, processes created and the metrics summary
+    the script wrote
+    """
+    fork_log = os.path.join(workdir, f"{name}.forks")
+    if os.path.exists(fork_log):
+        os.remove(fork_log)
+    start = time.monotonic()
+    with open(os.path.join(workdir, f"{name}.log"), 'a') as log:
+        process = subprocess.Popen([sys.executable, '-c', LAUNCHER, fork_log,
+                                    os.path.join(SCRIPT_DIR, f"{name}.py")] + args,
+                                   cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+    wall = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    forks = {}
+    if os.path.exists(fork_log):
+        with open(fork_log, 'r') as fil:
+            for event in fil.read().split():
+                forks[event] = forks.get(event, 0) + 1
+    result = {'exit': process.returncode, 'wall': round(wall, 3),
+              'cpu': round(usage.ru_utime + usage.ru_stime, 3),
+              # kilobytes on Linux, highest of the script and its worker processes
+              'max_rss_kb': usage.ru_maxrss,
+              'forks': sum(forks.values()), 'fork_events': forks}
+    try:
+        with open(metrics_file, 'r') as fil:
+            result['metrics'] = json.load(fil)
+    except (OSError, ValueError):
+        result['metrics'] = None
+    return result
+
+def write_config(workdir, url, products, metadata, args):
+    store = os.path.join(workdir, 'store')
+    with open(os.path.join(workdir, 'config.ini'), 'w') as fil:
+        fil.write(f"""[server]
+url = {url}
+paths = {{product_name}}/Update/src, {{product_name}}/GA/src
+pathb = {{product_name}}/Update
+pathsSLFO = {{product_name}}/Update/src, {{product_name}}/GA/src
+pathbSLFO = {{product_name}}/Update
+metadata = {metadata}
+
+[download]
+workers = {args.workers}
+per_host = {args.per_host}
+
+[files]
+packages = packages.list
+
+[store]
+path = {store}
+
+[report]
+workers = {args.report_workers}
+formats = html
+
+[metrics]
+path = metrics
+
+[products]
+product_names = {', '.join(products)}
+""")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--products', type=int, default=4, help="number of products (N)")
+    parser.add_argument('--packages', type=int, default=50, help="packages per product (M)")
+    parser.add_argument('--size', type=int, default=256 * 1024, help="median tarball size in bytes")
+    parser.add_argument('--changelog', type=int, default=200, help="changelog entries of each package")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds before each response")
+    parser.add_argument('--bandwidth', type=int, default=0, help="bytes/s per connection, 0: unlimited")
+    parser.add_argument('--metadata', choices=['html', 'repodata', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=5, help="[download] workers")
+    parser.add_argument('--per-host', type=int, default=4, help="[download] per_host")
+    parser.add_argument('--report-workers', type=int, default=0, help="[report] workers")
+    parser.add_argument('--workdir', default='benchmark-work', help="generated tree and runs, removed first")
+    parser.add_argument('--output', default='benchmark.json', help="results file")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir)
+    shutil.rmtree(workdir, ignore_errors=True)
+    repo = os.path.join(workdir, 'repo')
+    products = [f"SLE-15-SP{number}" for number in range(1, args.products + 1)]
+    start = time.monotonic()
+    names = generate_tree(repo, products, args.packages, args.size, args.changelog)
+    print(f"Generated {args.products} products x {args.packages} packages in "
+          f"{time.monotonic() - start:.1f}s")
+
+    server = start_server(repo, args.latency, args.bandwidth)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    results = {'parameters': vars(args), 'runs': {}}
+    for metadata in (['html', 'repodata'] if args.metadata == 'both' else [args.metadata]):
+        rundir = os.path.join(workdir, metadata)
+        os.makedirs(rundir)
+        with open(os.path.join(rundir, 'packages.list'), 'w') as fil:
+            fil.write('\n'.join(names) + '\n')
+        write_config(rundir, url, products, metadata, args)
+        grab_metrics = os.path.join(rundir, 'metrics', 'grab_packages.json')
+        compare_metrics = os.path.join(rundir, 'metrics', 'package_comparison.json')
+        for step, script, script_args, metrics_file in (
+                ('grab_cold', 'grab_packages', [], grab_metrics),
+                ('grab_warm', 'grab_packages', [], grab_metrics),
+                ('compare_cold', 'package_comparison', ['results', 'packages.list'], compare_metrics),
+                ('compare_warm', 'package_comparison', ['results', 'packages.list'], compare_metrics)):
+            RepoHandler.requests = 0
+            result = run_script(script, script_args, rundir, metrics_file)
+            result['requests'] = RepoHandler.requests
+            results['runs'][f"{metadata}/{step}"] = result
+            print(f"{metadata:8} {step:12} exit {result['exit']}  {result['wall']:8.2f}s wall  "
+                  f"{result['cpu']:8.2f}s cpu  {result['max_rss_kb'] // 1024:5d} MB  "
+                  f"{result['forks']} forks  {result['requests']} requests")
+    server.shutdown()
+
+    with open(args.output, 'w') as fil:
+        json.dump(results, fil, indent=1)
+    print(f"Results in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Content addressed store of downloaded files. Each file is kept once under
+<store>/.blobs/<checksum type>/<2 first chars>/<checksum>, and the product
+directories get hardlinks (or reflinks, or copies) to it, so a package
+identical across products is downloaded and stored only once.
+"""
+import fcntl
+import os
+import shutil
+
+# ioctl(FICLONE) shares the data blocks of two files on btrfs/xfs
+FICLONE = 0x40049409
+
+def blob_path(blob_dir, checksum_type, checksum):
+    """
+    Path of the blob for a checksum
+    """
+    return os.path.join(blob_dir, checksum_type, checksum[:2], checksum)
+
+def reflink(src, dst):
+    """
+    Clone src to dst sharing the same data blocks, raise OSError if not supported
+    """
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+
+def link_file(src, dst):
+    """
+    Make dst point to the same data as src: hardlink, then reflink, then copy
+    """
+    if os.path.exists(dst):
+        return
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        reflink(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def add_blob(blob_dir, checksum_type, checksum, file_path):
+    """
+    Move a verified file into the store and link it back to file_path.
+    If the blob already exists, file_path is replaced by a link to it.
+    """
+    blob = blob_path(blob_dir, checksum_type, checksum)
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    if os.path.exists(blob):
+        os.remove(file_path)
+    else:
+        os.replace(file_path, blob)
+    link_file(blob, file_path)
+    return blob
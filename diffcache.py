@@ -0,0 +1,162 @@
+"""
+Cache of diff artifacts keyed by the content of the two compared packages.
+A diff is computed once per unordered pair, in a canonical orientation, and
+the B-vs-A view is derived from the A-vs-B one by reversing it.
+"""
+import difflib
+import hashlib
+import re
+
+SPACES = re.compile(r'\s+')
+
+def pair_key(key_a, key_b):
+    """
+    Return (cache name, reversed) for two content keys: the cache name is the
+    same for (a, b) and (b, a), reversed is True if (key_a, key_b) is not the
+    canonical orientation.
+    """
+    first, second = sorted((key_a, key_b))
+    name = hashlib.sha256(f"{first}\0{second}".encode('utf-8')).hexdigest()
+    return name, (key_a, key_b) != (first, second)
+
+def format_range(start, stop):
+    """
+    'start,count' of a hunk header, as diff -u writes it
+    """
+    count = stop - start
+    if count == 1:
+        return f"{start + 1}"
+    if not count:
+        return f"{start},0"
+    return f"{start + 1},{count}"
+
+def grouped_opcodes(opcodes, context):
+    """
+    Split opcodes into hunks with at most context equal lines around changes
+    """
+    if opcodes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if opcodes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            yield group
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+def unified_diff(lines_a, lines_b, label_a, label_b, ignore_space=False, context=3):
+    """
+    Unified diff of two lists of lines, as 'diff -u' prints it ('' if equal).
+    With ignore_space, lines differing only in the amount of white space are
+    equal, like 'diff -b'. The common head and tail are trimmed before the
+    matcher runs: changelogs mostly grow at the top.
+    """
+    if ignore_space:
+        keys_a = [SPACES.sub(' ', line).rstrip() for line in lines_a]
+        keys_b = [SPACES.sub(' ', line).rstrip() for line in lines_b]
+    else:
+        keys_a, keys_b = lines_a, lines_b
+    if keys_a == keys_b:
+        return ''
+
+    head = 0
+    limit = min(len(keys_a), len(keys_b))
+    while head < limit and keys_a[head] == keys_b[head]:
+        head += 1
+    tail = 0
+    limit -= head
+    while tail < limit and keys_a[-1 - tail] == keys_b[-1 - tail]:
+        tail += 1
+    end_a = len(keys_a) - tail
+    end_b = len(keys_b) - tail
+    # autojunk keeps the matcher near linear on long changelogs (frequent lines
+    # like blank lines or '- Update to ...' do not start matches), at the cost
+    # of a slightly larger diff than 'diff -u' in places
+    matcher = difflib.SequenceMatcher(None, keys_a[head:end_a], keys_b[head:end_b])
+    opcodes = [('equal', 0, head, 0, head)] if head else []
+    opcodes.extend((tag, i1 + head, i2 + head, j1 + head, j2 + head)
+                   for tag, i1, i2, j1, j2 in matcher.get_opcodes())
+    if tail:
+        opcodes.append(('equal', end_a, len(keys_a), end_b, len(keys_b)))
+
+    out = [f"--- {label_a}\n", f"+++ {label_b}\n"]
+    for group in grouped_opcodes(opcodes, context):
+        out.append(f"@@ -{format_range(group[0][1], group[-1][2])} "
+                   f"+{format_range(group[0][3], group[-1][4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                out.extend(' ' + line for line in lines_a[i1:i2])
+                continue
+            out.extend('-' + line for line in lines_a[i1:i2])
+            out.extend('+' + line for line in lines_b[j1:j2])
+    return ''.join(line if line.endswith('\n') else line + '\n\\ No newline at end of file\n'
+                   for line in out)
+
+def reverse_unified_diff(text):
+    """
+    Turn a unified diff of a against b into the diff of b against a
+    """
+    out = []
+    removed = []
+    added = []
+
+    def flush():
+        out.extend(removed)
+        out.extend(added)
+        removed.clear()
+        added.clear()
+
+    lines = text.splitlines(keepends=True)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith('--- ') and i + 1 < len(lines) and lines[i + 1].startswith('+++ '):
+            flush()
+            out.append('--- ' + lines[i + 1][4:])
+            out.append('+++ ' + line[4:])
+            i += 2
+            continue
+        if line.startswith('@@ '):
+            flush()
+            parts = line.split(' ', 3)
+            rest = parts[3] if len(parts) > 3 else '\n'
+            out.append(f"@@ -{parts[2][1:]} +{parts[1][1:]} {rest}")
+        elif line.startswith('-'):
+            added.append('+' + line[1:])
+        elif line.startswith('+'):
+            removed.append('-' + line[1:])
+        elif line.startswith('\\'):
+            # '\ No newline at end of file' stays after the line it is about
+            previous = lines[i - 1][:1] if i else ''
+            if previous == '-':
+                added.append(line)
+            elif previous == '+':
+                removed.append(line)
+            else:
+                flush()
+                out.append(line)
+        elif line.startswith('Binary files ') and line.rstrip('\n').endswith(' differ'):
+            flush()
+            # 'Binary files <from> and <to> differ'
+            from_path, _, to_path = line[len('Binary files '):-len(' differ\n')].partition(' and ')
+            out.append(f"Binary files {to_path} and {from_path} differ\n")
+        elif line.startswith('diff '):
+            flush()
+            # 'diff <options> <from> <to>'
+            words = line.split()
+            if len(words) >= 3:
+                words[-2], words[-1] = words[-1], words[-2]
+            out.append(' '.join(words) + '\n')
+        else:
+            flush()
+            out.append(line)
+        i += 1
+    flush()
+    return ''.join(out)
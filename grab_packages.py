@@ -1,101 +1,401 @@
 #!/usr/bin/python3
 # 01/2025
 # aginies@suse.com
-import ssl
-import urllib.request
+import hashlib
+import http.client
+import urllib.error
+import urllib.parse
 import re
 import configparser
 import os
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from repodata import Package, repo_root, parse_repomd, open_compressed, parse_primary
+from metacache import load_cache_entry, save_cache_entry, revalidation_headers
+from httpclient import HTTPClient
+from scheduler import DownloadScheduler, HostSlots
+from matcher import PackageMatcher, split_rpm_filename
+from rpmver import evr_key
+from blobstore import blob_path, link_file, add_blob
+from metrics import METRICS
+from mirrors import Mirrors, mirror_group
 
-def download_file(file_url, file_path, thread_id):
+# shared keep-alive client, set up by grab_files() from the [server] section
+HTTP_CLIENT = HTTPClient()
+# per host limit of parallel requests, shared by listing fetches and downloads
+HOST_SLOTS = HostSlots(4)
+# content addressed store shared by all products, None to disable it
+BLOB_DIR = None
+# one progress bar for all the downloads of the run, set up by grab_files()
+PROGRESS = None
+# mirrors of the server of each product, set up by grab_files()
+MIRRORS = Mirrors()
+# attempts per mirror after the first one, and first delay between them (doubled each time)
+RETRIES = 3
+BACKOFF = 2
+# urls that could not be downloaded from any mirror
+FAILED = []
+FAILED_LOCK = threading.Lock()
+
+def checksum_name(checksum_type):
+    """
+    hashlib name of a repodata checksum type ('sha' is the old name of sha1)
+    """
+    return {'sha': 'sha1'}.get(checksum_type, checksum_type)
+
+class VerificationError(ValueError):
     """
-    Downloads a single file with a progress bar.
+    The downloaded data does not match the expected size or checksum
     """
+
+def download_file(file_url, file_path, thread_id, package=None, mirror=None):
+    """
+    Downloads a single file, counted in the run progress bar and metrics.
+    Data goes to file_path.part, which is resumed with a Range request if it
+    already exists. The size (and the checksum if the repository metadata
+    gives one) is verified before renaming it to file_path, so an existing
+    file_path is always a complete download. The file is then moved to the
+    blob store and linked back to file_path. The transfer is measured for
+    mirror, the base url file_url is on.
+    Errors are raised, fetch_file() retries them.
+    """
+    part_path = f"{file_path}.part"
+    file_name = os.path.basename(file_path)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    expected_size = package.size if package else None
+    expected_checksum = package.checksum if package and package.checksum else None
+    # without repodata the file is still hashed to be stored in the blob store
+    checksum_type = checksum_name(package.checksum_type) if expected_checksum else 'sha256'
+    hasher = hashlib.new(checksum_type)
+    received = 0
+    # bytes this attempt added to the progress bar total
+    counted = 0
+    complete = False
+    start = time.monotonic()
     try:
-        with urllib.request.urlopen(file_url, context=ssl.create_default_context()) as response:
-            file_size = int(response.info().get('Content-Length', 0))
-            block_size = 8192
-            file_name = os.path.basename(file_path)
+        try:
+            headers = {'Range': f"bytes={offset}-"} if offset else {}
+            with HTTP_CLIENT.open(file_url, headers) as response:
+                if offset and response.status != 206:
+                    tqdm.write(f"Thread {thread_id}: {file_name}: server does not support resume, restarting")
+                    METRICS.count('resume_restarts')
+                    offset = 0
+                elif offset:
+                    METRICS.count('resumed')
+                length = response.info().get('Content-Length')
+                if expected_size is None and length is not None:
+                    expected_size = offset + int(length)
+                if expected_size is not None:
+                    counted = expected_size - offset
+                    with PROGRESS.get_lock():
+                        PROGRESS.total += counted
+                block_size = 65536
 
-            # Create a tqdm progress bar
-            progress_bar = tqdm(total=file_size, unit='B', unit_scale=True,
-                                desc=f"{file_name}",
-                                position=thread_id, leave=True)
+                with open(part_path, 'ab' if offset else 'wb') as out_file:
+                    if offset:
+                        with open(part_path, 'rb') as part_file:
+                            for data in iter(lambda: part_file.read(block_size), b""):
+                                hasher.update(data)
+                    for data in iter(lambda: response.read(block_size), b""):
+                        out_file.write(data)
+                        hasher.update(data)
+                        received += len(data)
+                        PROGRESS.update(len(data))
+        except urllib.error.HTTPError as err:
+            # 416: the .part file may already hold the whole file, just verify it
+            if err.code != 416 or not offset:
+                raise
+            if expected_size is None:
+                # without repodata, the size comes from 'Content-Range: bytes */<size>'
+                match = re.fullmatch(r'bytes \*/(\d+)', (err.headers or {}).get('Content-Range', '').strip())
+                if match is None:
+                    os.remove(part_path)
+                    raise VerificationError("416 without the file size, the partial download can not be verified")
+                expected_size = int(match.group(1))
+            with open(part_path, 'rb') as part_file:
+                for data in iter(lambda: part_file.read(65536), b""):
+                    hasher.update(data)
 
-            with open(file_path, 'wb') as out_file:
-                for data in iter(lambda: response.read(block_size), b""):
-                    out_file.write(data)
-                    out_file.flush()
-                    progress_bar.update(len(data))
+        size = os.path.getsize(part_path)
+        if expected_size is not None and size != expected_size:
+            METRICS.count('size_mismatches')
+            if size > expected_size:
+                os.remove(part_path)
+            raise VerificationError(f"got {size} bytes, expected {expected_size}")
+        if expected_checksum and hasher.hexdigest() != expected_checksum:
+            METRICS.count('checksum_mismatches')
+            os.remove(part_path)
+            raise VerificationError(f"{checksum_type} checksum mismatch")
+        os.replace(part_path, file_path)
+        if BLOB_DIR:
+            add_blob(BLOB_DIR, checksum_type, hasher.hexdigest(), file_path)
+        METRICS.count('downloads')
+        complete = True
 
-            progress_bar.close()
-            #print(f"Thread {thread_id}: {file_name} - Downloaded")
+    finally:
+        if not complete and counted > received:
+            # the next attempt counts again what this one did not receive
+            with PROGRESS.get_lock():
+                PROGRESS.total -= counted - received
+        seconds = time.monotonic() - start
+        METRICS.add_phase('download', seconds)
+        METRICS.transfer(file_url, received, seconds)
+        MIRRORS.record(mirror, received, seconds)
+        PROGRESS.set_description_str(f"{METRICS.get('downloads')}/{METRICS.get('scheduled')} files",
+                                     refresh=False)
 
-            os.system('clear')
+def is_transient(err):
+    """
+    True if retrying on the same mirror may help: transport errors, 5xx,
+    408/429 and data that failed verification
+    """
+    if isinstance(err, urllib.error.HTTPError):
+        return err.code >= 500 or err.code in (408, 429)
+    if isinstance(err, ValueError):
+        return isinstance(err, VerificationError)
+    return isinstance(err, (OSError, http.client.HTTPException))
 
-    except urllib.error.HTTPError as err:
-        print(f"Thread {thread_id}: Error downloading {file_url}: {err.code} - {err.reason}")
+def with_failover(url, group, attempt):
+    """
+    Return attempt(candidate url, mirror) for the first mirror of group where
+    it succeeds, fastest mirror first. Transient errors are retried on the
+    same mirror with an exponential backoff, and the mirror is tried last for
+    a while. Other errors (not found, other 4xx, missing python module...) go
+    to the next mirror at once. The last error is raised if all the mirrors failed.
+    """
+    last_error = None
+    for number, (mirror, candidate) in enumerate(MIRRORS.candidates(url, group)):
+        if number:
+            tqdm.write(f"Trying {candidate}")
+            METRICS.count('failovers')
+        for retry in range(RETRIES + 1):
+            if retry:
+                time.sleep(BACKOFF * 2 ** (retry - 1))
+                METRICS.count('retries')
+            try:
+                with HOST_SLOTS.get(candidate):
+                    return attempt(candidate, mirror)
+            except (OSError, ValueError, http.client.HTTPException) as err:
+                last_error = err
+                tqdm.write(f"{candidate}: {err}")
+                if not is_transient(err):
+                    break
+                MIRRORS.failed(mirror)
+    raise last_error
+
+def fetch_file(file_url, file_path, thread_id, package=None, group=None):
+    """
+    Download a file from the mirror group of its product, with retries and failover.
+    A file that could not be downloaded is reported at the end of the run.
+    """
+    try:
+        with_failover(file_url, group,
+                      lambda url, mirror: download_file(url, file_path, thread_id, package, mirror))
     except (KeyboardInterrupt, Exception) as err:
-        print(f"Thread {thread_id}: Download interrupted. Attempting to save progress...")
-        out_file.flush()
-        print(f"Thread {thread_id}: {type(err).__name__} occurred: {err}")
+        tqdm.write(f"Thread {thread_id}: Download of {os.path.basename(file_path)} failed on all mirrors, "
+                   f"it will be resumed on next run")
+        tqdm.write(f"Thread {thread_id}: {type(err).__name__} occurred: {err}")
+        METRICS.count('download_failures')
+        with FAILED_LOCK:
+            FAILED.append(file_url)
 
 
-def split_version(version):
-    # Split the version string into parts based on changes in character types (digits vs. letters)
-    return re.findall(r'[a-z]+|\d+', version)
+def find_latest_version(package_version, product_packages):
+    """
+    Select the latest url of each package, in one pass with rpm EVR ordering
+    """
+    for package, details in package_version.items():
+        latest_url, latest = max(details['packages'].items(),
+                                 key=lambda item: evr_key(item[1].epoch, item[1].version, item[1].release))
+        product_packages[package] = {'versions': latest.version, 'urls': latest_url,
+                                     # repository metadata (size, checksum) of the selected url, if known
+                                     'package': latest}
 
-def get_latest_version(versions):
-    return max(versions, key=lambda v: split_version(v))
+    return product_packages
 
-def get_build_tuple(package, url):
-    build_str = url.split(package)[-1].split('.src')[0]
+def download_latest_version(product_packages, product_name, product_dir, group, scheduler):
+    """
+    Queue the download of the selected url of each package in the run-wide scheduler
+    """
+    for _, details in product_packages.items():
+        urls = details.get('urls', set())
+        file_name = os.path.basename(urls)
+        file_path = os.path.join(product_dir, file_name)
 
-    # Split on non-digit characters (e.g., hyphens)
-    parts = [part for part in build_str.replace('-', '').split('.') if part.isdigit()]
+        if os.path.exists(file_path):
+            tqdm.write(f"File {file_name} already exists in {product_name}. Skipping download.")
+            METRICS.count('skipped_existing')
+            continue
 
-    return tuple(map(int, parts))
+        package = details.get('package')
+        if BLOB_DIR and package and package.checksum:
+            blob = blob_path(BLOB_DIR, checksum_name(package.checksum_type), package.checksum)
+            if os.path.exists(blob):
+                link_file(blob, file_path)
+                tqdm.write(f"File {file_name} already in the blob store, linked in {product_name}.")
+                METRICS.count('blob_links')
+                continue
 
-def find_latest_version(package_version, product_packages):
-    for package, details in package_version.items():
-        versions = details.get('versions', set())
-        urls = details.get('urls', set())
-        #print(f"FLV {package}: {versions} {urls}")
-        latest_version = get_latest_version(versions)
-        if package not in product_packages:
-            product_packages[package] = {'versions': set(), 'urls': set()}
+        if scheduler.submit(urls, file_path, package, group):
+            METRICS.count('scheduled')
+        else:
+            tqdm.write(f"{file_name} already scheduled for {product_name}")
+            METRICS.count('skipped_scheduled')
+
+def open_revalidated(url, entry):
+    """
+    Open url sending the validators of the cached entry.
+    Returns the response, or None if the server replied 304 Not Modified.
+    """
+    try:
+        return HTTP_CLIENT.open(url, revalidation_headers(entry))
+    except urllib.error.HTTPError as err:
+        if err.code == 304 and entry is not None:
+            return None
+        raise
+
+def fetch_listing_packages(url, cache_dir):
+    """
+    Return [file_name, name, version, release, arch] for each source package
+    linked from an HTML directory listing. The parsed list is cached: nothing
+    is parsed again if the listing is not modified.
+    """
+    entry = load_cache_entry(cache_dir, url)
+    if entry is not None and not isinstance(entry['data'], dict):
+        # raw links stored by an older version, fetch the listing again
+        entry = None
+    start = time.monotonic()
+    response = open_revalidated(url, entry)
+    if response is None:
+        METRICS.transfer(url, 0, time.monotonic() - start)
+        tqdm.write(f"{url} not modified, using cached listing")
+        METRICS.count('listing_cache_hits')
+        return entry['data']['packages']
+    METRICS.count('listing_fetches')
 
-        sorted_urls = sorted(urls, key=lambda x: get_build_tuple(package, x), reverse=True)
-        latest_url = sorted_urls[0]
-        print("Latest URL:", latest_url)
-        product_packages[package]['versions'] = latest_version
-        product_packages[package]['urls'] = latest_url
+    with response:
+        html = response.read().decode('utf-8')
+        METRICS.transfer(url, response.received, time.monotonic() - start)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
 
-    return product_packages
+    packages = []
+    # Find all <a> tags with href attributes
+    for link in re.findall(r'<a href="([^"]+)"', html):
+        # Remove everything after '<' if it exists
+        file_name = link.split('<')[0].rsplit('/', 1)[-1]
+        parsed = split_rpm_filename(urllib.parse.unquote(file_name))
+        if parsed is None or parsed[3] not in ('src', 'nosrc'):
+            continue
+        packages.append([file_name, *parsed])
+    save_cache_entry(cache_dir, url, etag, last_modified, {'packages': packages})
+    return packages
 
-def download_latest_version(product_packages, product_name, product_dir):
-    # Create a ThreadPoolExecutor with a maximum of 5 worker threads
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        thread_id = 1
-
-        for _, details in product_packages.items():
-            #print("DEBUG", package)
-            #versions = details.get('versions', set())
-            urls = details.get('urls', set())
-            #print("DL", urls, versions)
-            #for url in urls:
-            file_name = os.path.basename(urls)
-            file_path = os.path.join(product_dir, file_name)
-
-            if os.path.exists(file_path):
-                print(f"File {file_name} already exists in {product_name}. Skipping download.")
-                continue
+def fetch_repodata_packages(url, cache_dir):
+    """
+    Read repodata/repomd.xml of the repository containing url, then stream and
+    parse its primary.xml. Returns a list of (package_url, Package) for source packages.
+    The package index is cached: nothing is parsed if repomd.xml is not modified
+    or still points to the same primary.xml checksum.
+    """
+    root = repo_root(url)
+    repomd_url = f"{root}/repodata/repomd.xml"
+    entry = load_cache_entry(cache_dir, repomd_url)
+    start = time.monotonic()
+    response = open_revalidated(repomd_url, entry)
+    if response is None:
+        METRICS.transfer(repomd_url, 0, time.monotonic() - start)
+        tqdm.write(f"{repomd_url} not modified, using cached package index")
+        METRICS.count('repodata_cache_hits')
+        data = entry['data']
+    else:
+        with response:
+            records = parse_repomd(response)
+            METRICS.transfer(repomd_url, response.received, time.monotonic() - start)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        if 'primary' not in records:
+            tqdm.write(f"No primary metadata in {repomd_url}")
+            return []
+
+        primary_href, _, primary_checksum = records['primary']
+        if entry is not None and entry['data'].get('primary_checksum') == primary_checksum:
+            tqdm.write(f"{primary_href} unchanged, using cached package index")
+            METRICS.count('repodata_cache_hits')
+            data = entry['data']
+        else:
+            METRICS.count('primary_parses')
+            packages = []
+            start = time.monotonic()
+            with HTTP_CLIENT.open(f"{root}/{primary_href}") as response:
+                for package in parse_primary(open_compressed(response, primary_href)):
+                    if package.arch not in ('src', 'nosrc'):
+                        continue
+                    packages.append([f"{root}/{package.location}", list(package)])
+                METRICS.transfer(response.url, response.received, time.monotonic() - start)
+            data = {'primary_checksum': primary_checksum, 'packages': packages}
+        save_cache_entry(cache_dir, repomd_url, etag, last_modified, data)
+
+    return [(package_url, Package(*fields)) for package_url, fields in data['packages']]
+
+def add_repodata_packages(url, cache_dir, matcher, package_version):
+    """
+    Fill package_version from the repository metadata, keeping the Package
+    record (size, checksum) of each url for the later steps.
+    """
+    for package_url, package in fetch_repodata_packages(url, cache_dir):
+        if not matcher.match(package.name, package.version):
+            continue
+        if package.name not in package_version:
+            package_version[package.name] = {'packages': {}}
+        package_version[package.name]['packages'][package_url] = package
 
-            print(urls, file_path, thread_id)
-            executor.submit(download_file, urls, file_path, thread_id)
-            thread_id += 1
+def add_listing_packages(url, cache_dir, matcher, package_version):
+    """
+    Fill package_version from the source packages of the HTML directory listing,
+    parsed once into name/version/release and looked up in the matcher.
+    """
+    for file_name, name, version, release, arch in fetch_listing_packages(url, cache_dir):
+        if not matcher.match(name, version):
+            continue
+        package_url = f"{url.rstrip('/')}/{file_name}"
+        if name not in package_version:
+            package_version[name] = {'packages': {}}
+        package_version[name]['packages'][package_url] = Package(name, None, version, release, arch,
+                                                                 None, None, None, file_name)
+
+def process_path(product_name, product_dir, path, url, group, metadata, cache_dir, matcher, scheduler):
+    """
+    Fetch the listing of one path of a product and queue the latest version of
+    each package, from the mirrors in group
+    """
+    tqdm.write(f"Working on product: {product_name}, checking path: {url}")
+
+    def list_packages(candidate, mirror):
+        package_version = {}
+        if metadata == 'repodata':
+            add_repodata_packages(candidate, cache_dir, matcher, package_version)
+        else:
+            add_listing_packages(candidate, cache_dir, matcher, package_version)
+        return package_version
+
+    try:
+        with METRICS.phase('listing', f"{product_name}/{path}"):
+            package_version = with_failover(url, group, list_packages)
+        product_packages = find_latest_version(package_version, {})
+        download_latest_version(product_packages, product_name, product_dir, group, scheduler)
+
+    except urllib.error.HTTPError as err:
+        if err.code == 404:
+            tqdm.write(f"HTTP Error 404 for path {path}: Not Found")
+        else:
+            tqdm.write(f"HTTP Error for path {path}: {err.code} - {err.reason}")
+            if hasattr(err, 'read'):
+                tqdm.write(err.read().decode('utf-8'))
+    except Exception as err:
+        tqdm.write(f"An error occurred on {url}: {err}")
 
 def grab_files(config):
     """
@@ -103,6 +403,7 @@ def grab_files(config):
     Returns:
         None
     """
+    global HTTP_CLIENT, HOST_SLOTS, BLOB_DIR, PROGRESS, MIRRORS, RETRIES, BACKOFF
     try:
         # Read configuration
         server_url = config.get('server', 'url')
@@ -113,18 +414,31 @@ def grab_files(config):
         packages_file = config.get('files', 'packages')
         product_names = config.get('products', 'product_names').split(',')
         store_path = config.get('store', 'path')
+        # 'html' scrapes the directory listing, 'repodata' reads repodata/primary.xml
+        metadata = config.get('server', 'metadata', fallback='html').strip()
+        # parsed listings and package indexes, revalidated with ETag/Last-Modified
+        cache_dir = os.path.join(store_path, '.metadata-cache')
+        if config.getboolean('store', 'dedup', fallback=True):
+            BLOB_DIR = os.path.join(store_path, '.blobs')
+        HOST_SLOTS = HostSlots(config.getint('download', 'per_host', fallback=4),
+                               config.getfloat('download', 'rate', fallback=0))
+        RETRIES = config.getint('download', 'retries', fallback=3)
+        BACKOFF = config.getfloat('download', 'backoff', fallback=2)
+        # [server] url and its mirrors, or the mirrors of a product in [mirrors]
+        MIRRORS = Mirrors()
+        default_mirrors = [server_url] + config.get('server', 'mirrors', fallback='').split(',')
+        HTTP_CLIENT = HTTPClient(pool_size=config.getint('server', 'pool_size', fallback=8),
+                                 timeout=config.getfloat('server', 'timeout', fallback=60))
 
         # Read patterns from the packages_file
         with open(packages_file, 'r') as fil:
             patterns = [line.strip() for line in fil]
         patterns = [line for line in patterns if line]  # Remove empty lines
+        matcher = PackageMatcher(patterns)
 
-        # Clear the screen at the beginning
-        os.system('clear')
-
+        tasks = []
         for product_name in product_names:
             product_name = product_name.strip()
-            print(f"Working on product: {product_name}")
             # Determine the correct path template based on product name
             if not re.match(r'SLE-1[2-5]-SP\d+', product_name):
                 paths_template = paths_slfo_template
@@ -138,67 +452,41 @@ def grab_files(config):
             paths = [p.strip().replace('{product_name}', product_name) for p in paths_template.split(',')]
             pathb = [p.strip().replace('{product_name}', product_name) for p in pathb_template.split(',')]
 
+            mirrors = default_mirrors
+            if config.has_option('mirrors', product_name):
+                mirrors = config.get('mirrors', product_name).split(',')
+            group = mirror_group(mirrors)
+
             for path in paths:
-                url = f"{server_url}/{path}"
-                print(f"Checking path: {url}")
-                try:
-                    with urllib.request.urlopen(url, context=ssl.create_default_context()) as response:
-                        html = response.read().decode('utf-8')
-                    # Find all <a> tags with href attributes
-                    links = re.findall(r'<a href="([^"]+)"', html)
-                    #print(links)
-                    product_packages = []
-                    package_version = {}
-                    package_url = None
-                    name_part = ""
-                    version_part = ""
-                    extra_part = ""
-                    if links:
-                        product_packages = {}
-                        for file_name in links:
-                            # Remove everything after '<' if it exists
-                            file_name = file_name.split('<')[0]
-                            #print("Working on:", file_name)
-                            # Check if the filename matches any pattern AND ends with "src.rpm"
-                            for pattern in patterns:
-                                if pattern in file_name and file_name.endswith("src.rpm"):
-                                    #print("DEBUG pattern match src.rpm", pattern)
-                                    parts = file_name.split('-')
-                                    #print(parts)
-                                    second_last_part = parts[-2]
-                                    # Check if the last part is a number
-                                    if parts and len(parts[-1]) > 0 and second_last_part[0].isdigit():
-                                        name_part_s = '-'.join(parts[:-2])
-                                        name_part = (name_part_s.lstrip('.')).lstrip('/')
-                                        # The pre-last part is the version number
-                                        version_part = ''.join(parts[-2])
-                                        extra_part = ''.join(parts[-1])
-                                        if name_part != "pattern":
-                                            continue
-                                        if name_part not in package_version:
-                                            package_version[name_part] = {'versions': set(), 'urls': set()}
-                                        #print("DEBUG:", name_part)
-                                        package_url = url+"/"+name_part+"-"+version_part+"-"+extra_part
-                                        package_version[name_part]['versions'].add(version_part)
-                                        package_version[name_part]['urls'].add(package_url)
-                                    else:
-                                        print(f"Sounds like a BUG for {parts}")
-
-                        product_packages = find_latest_version(package_version, product_packages)
-                        #print(product_packages)
-                        download_latest_version(product_packages, product_name, product_dir)
-
-                except urllib.error.HTTPError as err:
-                    if err.code == 404:
-                        print(f"HTTP Error 404 for path {path}: Not Found")
-                    else:
-                        print(f"HTTP Error for path {path}: {err.code} - {err.reason}")
-                        if hasattr(err, 'read'):
-                            print(err.read().decode('utf-8'))
+                tasks.append((product_name, product_dir, path, f"{group[0]}/{path}", group))
+
+        # listings of all products are fetched in parallel and feed the download queue
+        scheduler = DownloadScheduler(fetch_file,
+                                      workers=config.getint('download', 'workers', fallback=5),
+                                      queue_size=config.getint('download', 'queue_size', fallback=100))
+        PROGRESS = tqdm(total=0, unit='B', unit_scale=True, desc="downloads", mininterval=0.5)
+        with ThreadPoolExecutor(max_workers=config.getint('download', 'listing_workers', fallback=4)) as executor:
+            for product_name, product_dir, path, url, group in tasks:
+                executor.submit(process_path, product_name, product_dir, path, url, group,
+                                metadata, cache_dir, matcher, scheduler)
+        scheduler.join()
+        PROGRESS.close()
 
     except Exception as err:
         print(f"An error occurred: {err}")
 
-CONFIG = configparser.ConfigParser()
-CONFIG.read('config.ini')
-grab_files(CONFIG)
+    # timings and counters of the run, to see where the time went
+    metrics_dir = config.get('metrics', 'path', fallback='metrics')
+    summary = METRICS.write('grab_packages', os.path.join(metrics_dir, 'grab_packages.json'),
+                            config.get('metrics', 'prometheus_dir', fallback=None))
+    print(f"Done in {summary['duration']}s: {summary['counters'].get('downloads', 0)} downloads, "
+          f"{sum(host['bytes'] for host in summary['hosts'].values())} bytes, metrics in {metrics_dir}")
+    if FAILED:
+        print(f"{len(FAILED)} files could not be downloaded from any mirror:")
+        for url in sorted(FAILED):
+            print(f"  {url}")
+
+if __name__ == "__main__":
+    CONFIG = configparser.ConfigParser()
+    CONFIG.read('config.ini')
+    grab_files(CONFIG)
@@ -0,0 +1,159 @@
+"""
+Small HTTP client keeping connections alive and pooled per host, with a single
+SSL context for the whole run, so hundreds of requests against the same server
+do not each pay a TCP and TLS handshake.
+"""
+import http.client
+import io
+import ssl
+import threading
+import urllib.error
+import urllib.parse
+from metrics import METRICS
+
+MAX_REDIRECTS = 5
+
+class Response:
+    """
+    Response returned by HTTPClient.open(), it can be used like the object
+    returned by urllib.request.urlopen(). The connection goes back to the pool
+    once the body has been fully read and the response closed.
+    """
+    def __init__(self, client, key, conn, response, url):
+        self.client = client
+        self.key = key
+        self.conn = conn
+        self.response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        # body bytes read so far, for the transfer metrics
+        self.received = 0
+
+    def info(self):
+        return self.headers
+
+    def read(self, amt=None):
+        data = self.response.read(amt)
+        self.received += len(data)
+        return data
+
+    def readinto(self, buf):
+        size = self.response.readinto(buf)
+        self.received += size
+        return size
+
+    def close(self):
+        if self.conn is None:
+            return
+        if self.response.isclosed():
+            # body fully read: the connection can be reused
+            self.client.release(self.key, self.conn)
+        else:
+            self.response.close()
+            self.conn.close()
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class HTTPClient:
+    """
+    Keep-alive HTTP/HTTPS client with a per host pool of idle connections
+    """
+    def __init__(self, pool_size=8, timeout=60):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.ssl_context = ssl.create_default_context()
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key):
+        """
+        Return an idle connection to (scheme, host, port) or a new one, and
+        True if it is a reused one
+        """
+        with self.lock:
+            idle = self.pools.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                               context=self.ssl_context), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def release(self, key, conn):
+        """
+        Put back a connection in the pool, or close it if the pool is full
+        """
+        with self.lock:
+            idle = self.pools.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """
+        Close all the idle connections
+        """
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    def request(self, url, headers):
+        """
+        Send one GET request, retrying once with a new connection if a reused
+        keep-alive connection was closed by the server in the meantime.
+        """
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        # urls from config.ini contain ':' in the path, they must stay as is
+        target = urllib.parse.quote(target, safe="/:?=&%+~@!$,;'()*")
+
+        while True:
+            conn, reused = self.acquire(key)
+            try:
+                conn.request('GET', target, headers=headers)
+                return key, conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                METRICS.count('http_retries')
+            except Exception:
+                conn.close()
+                raise
+
+    def open(self, url, headers=None):
+        """
+        GET url and return a Response. Redirects are followed, HTTP errors are
+        raised as urllib.error.HTTPError like urllib.request.urlopen() does.
+        """
+        headers = dict(headers or {})
+        for _ in range(MAX_REDIRECTS + 1):
+            key, conn, response = self.request(url, headers)
+            result = Response(self, key, conn, response, url)
+            if response.status in (301, 302, 303, 307, 308) and response.headers.get('Location'):
+                response.read()
+                result.close()
+                url = urllib.parse.urljoin(url, response.headers['Location'])
+                continue
+            if response.status >= 300:
+                body = response.read()
+                result.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, io.BytesIO(body))
+            return result
+        raise urllib.error.HTTPError(url, 310, "Too many redirects", None, None)
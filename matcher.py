@@ -0,0 +1,100 @@
+"""
+Matching of package names against the patterns of packages.list.
+A pattern is one of:
+    qemu          exact package name
+    python3-*     prefix, a single trailing '*'
+    spice-?tk*    glob (fnmatch syntax: *, ?, [...])
+An exact pattern ending with '-<digit>...' also matches the name before it with
+a version starting with what follows: kernel-source-6 matches kernel-source
+6.4.0 but not 5.14.21 (nor 60.1).
+All patterns are compiled once: exact names go in a set, prefixes in a trie,
+globs in one combined regex, so each name is checked in a single pass.
+"""
+import fnmatch
+import re
+
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+def split_rpm_filename(file_name):
+    """
+    Split 'dir/name-version-release.arch.rpm' into (name, version, release, arch),
+    return None if it is not an rpm file name
+    """
+    file_name = file_name.rsplit('/', 1)[-1]
+    if not file_name.endswith('.rpm'):
+        return None
+    nvr, _, arch = file_name[:-len('.rpm')].rpartition('.')
+    parts = nvr.rsplit('-', 2)
+    if len(parts) != 3 or not all(parts):
+        return None
+    name, version, release = parts
+    return name, version, release, arch
+
+def split_versioned(pattern):
+    """
+    Split 'name-version prefix' into (name, version prefix), None if the
+    part after the last '-' does not start with a digit
+    """
+    name, _, prefix = pattern.rpartition('-')
+    if not name or not prefix[:1].isdigit():
+        return None
+    return name, prefix
+
+def version_matches(version, prefix):
+    """
+    True if version starts with prefix, on a number boundary
+    """
+    return version.startswith(prefix) and not version[len(prefix):len(prefix) + 1].isdigit()
+
+class PackageMatcher:
+    """
+    Compiled set of packages.list patterns
+    """
+    def __init__(self, patterns):
+        self.exact = set()
+        # name -> version prefixes, from the 'name-version' patterns
+        self.versioned = {}
+        self.prefixes = {}
+        globs = []
+        for pattern in patterns:
+            if not GLOB_CHARS.search(pattern):
+                self.exact.add(pattern)
+                versioned = split_versioned(pattern)
+                if versioned:
+                    self.versioned.setdefault(versioned[0], []).append(versioned[1])
+            elif pattern.endswith('*') and not GLOB_CHARS.search(pattern[:-1]):
+                self.add_prefix(pattern[:-1])
+            else:
+                globs.append(fnmatch.translate(pattern))
+        self.glob = re.compile('|'.join(globs)) if globs else None
+
+    def add_prefix(self, prefix):
+        node = self.prefixes
+        for char in prefix:
+            node = node.setdefault(char, {})
+        # an empty key marks the end of a prefix
+        node[''] = True
+
+    def match_prefix(self, name):
+        node = self.prefixes
+        for char in name:
+            if '' in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return '' in node
+
+    def match(self, name, version=None):
+        """
+        True if name (with version, for the 'name-version' patterns) matches
+        one of the patterns
+        """
+        if name in self.exact:
+            return True
+        if version is not None and any(version_matches(version, prefix)
+                                       for prefix in self.versioned.get(name, ())):
+            return True
+        if self.prefixes and self.match_prefix(name):
+            return True
+        return bool(self.glob and self.glob.match(name))
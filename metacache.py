@@ -0,0 +1,48 @@
+"""
+On-disk cache of repository metadata, keyed by URL.
+Each entry stores the ETag / Last-Modified validators sent by the server and
+the parsed package index, so an unchanged repository only costs a 304 reply.
+"""
+import hashlib
+import json
+import os
+from atomicfile import write_atomic
+
+def cache_file(cache_dir, url):
+    """
+    Path of the cache entry for url
+    """
+    return os.path.join(cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+def load_cache_entry(cache_dir, url):
+    """
+    Return the cached entry for url: {'url', 'etag', 'last_modified', 'data'} or None
+    """
+    try:
+        with open(cache_file(cache_dir, url), 'r') as fil:
+            entry = json.load(fil)
+    except (OSError, ValueError):
+        return None
+    if entry.get('url') != url:
+        return None
+    return entry
+
+def save_cache_entry(cache_dir, url, etag, last_modified, data):
+    """
+    Store an entry
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    write_atomic(cache_file(cache_dir, url),
+                 json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified, 'data': data}))
+
+def revalidation_headers(entry):
+    """
+    Conditional request headers for a cached entry
+    """
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
@@ -0,0 +1,173 @@
+"""
+Run-wide metrics of grab_packages.py and package_comparison.py: time spent in
+each phase, counters (cache hits, skips, retries...), bytes and throughput
+per host and time per item (product path, package). At the end of a run they
+are written as a JSON summary, and optionally as a Prometheus textfile for
+the node_exporter textfile collector.
+"""
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from atomicfile import write_atomic
+
+class Metrics:
+    """
+    Thread safe accumulator of the metrics of one process
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # name -> value
+            self.counters = {}
+            # phase -> [seconds, count]
+            self.phases = {}
+            # host -> [bytes, seconds, requests]
+            self.hosts = {}
+            # phase -> {item: seconds}
+            self.items = {}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def add_phase(self, phase, seconds, count=1):
+        with self.lock:
+            total = self.phases.setdefault(phase, [0.0, 0])
+            total[0] += seconds
+            total[1] += count
+
+    @contextlib.contextmanager
+    def phase(self, phase, item=None):
+        """
+        Time the block as one occurrence of phase, and as item if given
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            self.add_phase(phase, seconds)
+            if item is not None:
+                self.add_item(phase, item, seconds)
+
+    def add_item(self, phase, item, seconds):
+        with self.lock:
+            items = self.items.setdefault(phase, {})
+            items[item] = items.get(item, 0.0) + seconds
+
+    def transfer(self, url, size, seconds):
+        """
+        Record size bytes received from the host of url in seconds
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            total = self.hosts.setdefault(host, [0, 0.0, 0])
+            total[0] += size
+            total[1] += seconds
+            total[2] += 1
+
+    def snapshot(self):
+        """
+        Picklable copy of the metrics, to be merged in another process
+        """
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'phases': {name: list(value) for name, value in self.phases.items()},
+                    'hosts': {name: list(value) for name, value in self.hosts.items()},
+                    'items': {phase: dict(items) for phase, items in self.items.items()}}
+
+    def merge(self, snapshot):
+        for name, value in snapshot['counters'].items():
+            self.count(name, value)
+        for name, (seconds, count) in snapshot['phases'].items():
+            self.add_phase(name, seconds, count)
+        with self.lock:
+            for host, (size, seconds, requests) in snapshot['hosts'].items():
+                total = self.hosts.setdefault(host, [0, 0.0, 0])
+                total[0] += size
+                total[1] += seconds
+                total[2] += requests
+        for phase, items in snapshot['items'].items():
+            for item, seconds in items.items():
+                self.add_item(phase, item, seconds)
+
+    def summary(self, run):
+        with self.lock:
+            return {
+                'run': run,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'duration': round(time.time() - self.started, 3),
+                'phases': {name: {'seconds': round(seconds, 3), 'count': count}
+                           for name, (seconds, count) in sorted(self.phases.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'hosts': {host: {'bytes': size, 'seconds': round(seconds, 3), 'requests': requests,
+                                 'throughput': round(size / seconds) if seconds else None}
+                          for host, (size, seconds, requests) in sorted(self.hosts.items())},
+                'items': {phase: {item: round(seconds, 3) for item, seconds in sorted(items.items())}
+                          for phase, items in sorted(self.items.items())},
+            }
+
+    def write(self, run, json_path, prometheus_dir=None):
+        """
+        Write the JSON summary of the run, and the Prometheus textfile
+        <prometheus_dir>/<run>.prom if prometheus_dir is set
+        """
+        summary = self.summary(run)
+        os.makedirs(os.path.dirname(json_path) or '.', exist_ok=True)
+        write_atomic(json_path, json.dumps(summary, indent=1) + '\n')
+        if prometheus_dir:
+            os.makedirs(prometheus_dir, exist_ok=True)
+            # the textfile collector may read it at any time
+            write_atomic(os.path.join(prometheus_dir, f"{run}.prom"), prometheus_text(summary))
+        return summary
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(summary):
+    """
+    Prometheus text exposition format of a summary
+    """
+    prefix = re.sub(r'[^a-zA-Z0-9_]', '_', summary['run'])
+    lines = [f"# TYPE {prefix}_last_run_duration_seconds gauge",
+             f"{prefix}_last_run_duration_seconds {summary['duration']}",
+             f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+             f"{prefix}_last_run_timestamp_seconds {int(time.time())}",
+             f"# TYPE {prefix}_phase_seconds gauge"]
+    lines += [f'{prefix}_phase_seconds{{phase="{label(name)}"}} {value["seconds"]}'
+              for name, value in summary['phases'].items()]
+    lines.append(f"# TYPE {prefix}_phase_count gauge")
+    lines += [f'{prefix}_phase_count{{phase="{label(name)}"}} {value["count"]}'
+              for name, value in summary['phases'].items()]
+    lines.append(f"# TYPE {prefix}_events gauge")
+    lines += [f'{prefix}_events{{name="{label(name)}"}} {value}'
+              for name, value in summary['counters'].items()]
+    for field in ('bytes', 'seconds', 'requests'):
+        lines.append(f"# TYPE {prefix}_host_{field} gauge")
+        lines += [f'{prefix}_host_{field}{{host="{label(host)}"}} {value[field]}'
+                  for host, value in summary['hosts'].items()]
+    return '\n'.join(lines) + '\n'
+
+# metrics of the current process
+METRICS = Metrics()
+
+def collected(func, *args):
+    """
+    Call func in a worker process and return (result, metrics of the call),
+    the caller merges them in its own METRICS
+    """
+    METRICS.clear()
+    result = func(*args)
+    return result, METRICS.snapshot()
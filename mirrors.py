@@ -0,0 +1,61 @@
+"""
+Mirrors of the download server: groups of base urls serving the same tree.
+Each request can be sent to any mirror of its group: the fastest one (by
+measured throughput) is tried first, mirrors that just failed are tried last.
+"""
+import threading
+import time
+
+# weight of the last transfer in the throughput estimate of a mirror
+SMOOTHING = 0.3
+
+def mirror_group(bases):
+    """
+    Group of base urls serving the same tree, the first one is the main server.
+    The group is passed along with each request, to Mirrors.candidates()
+    """
+    return [base.strip().rstrip('/') for base in bases if base.strip()]
+
+class Mirrors:
+    def __init__(self, cooldown=60):
+        # mirrors that failed are tried last during cooldown seconds
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        # base url -> bytes per second
+        self.speed = {}
+        # base url -> time until which it is tried last
+        self.down_until = {}
+
+    def candidates(self, url, group):
+        """
+        (mirror, url on this mirror) for each mirror of group, the preferred
+        one first. url must be on one of the mirrors of the group
+        """
+        base = next((base for base in group or [] if url.startswith(base + '/')), None)
+        if base is None:
+            return [(None, url)]
+        path = url[len(base):]
+        now = time.monotonic()
+        with self.lock:
+            # unmeasured mirrors come first, so each one gets measured once
+            order = sorted(group, key=lambda mirror: (self.down_until.get(mirror, 0) > now,
+                                                      -self.speed.get(mirror, float('inf'))))
+        return [(mirror, mirror + path) for mirror in order]
+
+    def record(self, mirror, size, seconds):
+        """
+        Update the throughput estimate of mirror with one transfer
+        """
+        if mirror is None or seconds <= 0 or not size:
+            return
+        with self.lock:
+            speed = size / seconds
+            if mirror in self.speed:
+                speed = SMOOTHING * speed + (1 - SMOOTHING) * self.speed[mirror]
+            self.speed[mirror] = speed
+            self.down_until.pop(mirror, None)
+
+    def failed(self, mirror):
+        if mirror is not None:
+            with self.lock:
+                self.down_until[mirror] = time.monotonic() + self.cooldown
@@ -1,14 +1,25 @@
 #!/usr/bin/env python3.13
 import configparser
+import functools
+import hashlib
+import html
+import json
 import os
 import re
-import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from rpmheader import rpm_header, format_changelog
+from rpmver import evr_key
+from matcher import split_rpm_filename, split_versioned, version_matches
+from srpmdiff import srpm_diff
+from report import ReportBuilder
+from atomicfile import write_atomic
+from diffcache import pair_key, reverse_unified_diff, unified_diff
+from metrics import METRICS, collected
 
 # Read config.ini
 config = configparser.ConfigParser()
 config.read('config.ini')
-rpm_diff_cmd = "/home/aginies/devel/github/aginies/grab_packages/rpmdiff"
 
 PRODUCTS = config['products']['product_names'].split(', ')
 STORE_PATH = config['store']['path']
@@ -47,21 +58,49 @@ def get_packages(package_file):
     with open(package_file, 'r') as fil:
         return [line.strip() for line in fil if line.strip()]
 
-def find_rpm_files2(package_name, store_path):
-    rpm_files = []
-    for root, _, files in os.walk(store_path):
-        for file in files:
-            if (file.endswith(f".{PACKAGE_EXTENSION}") and file.startswith(f"{package_name}-")):
-                rpm_files.append(os.path.join(root, file))
-    return rpm_files
-
-def find_rpm_files(package_name, store_path):
+def build_store_index(store_path):
+    """
+    Scan each product directory once: returns {product: {package name: [rpm paths]}},
+    the paths of a package sorted newest first by rpm version comparison
+    """
+    store_index = {}
+    for product in PRODUCTS:
+        candidates = {}
+        try:
+            entries = os.scandir(os.path.join(store_path, product))
+        except FileNotFoundError:
+            store_index[product] = candidates
+            continue
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith(f".{PACKAGE_EXTENSION}") or not entry.is_file():
+                    continue
+                parsed = split_rpm_filename(entry.name)
+                if parsed is None:
+                    continue
+                name, version, release, _ = parsed
+                candidates.setdefault(name, []).append((evr_key(None, version, release), entry.path))
+        for name, files in candidates.items():
+            files.sort(reverse=True)
+            candidates[name] = [path for _, path in files]
+        store_index[product] = candidates
+    return store_index
+
+def find_rpm_files(package_name, store_index):
+    """
+    Latest rpm of package_name in each product: an exact name, or for a
+    'name-version' entry (kernel-source-6) the name with that version prefix
+    """
+    versioned = split_versioned(package_name)
     rpm_files = []
     for product in PRODUCTS:
-        cmd = f"ls -t -1 {os.path.join(store_path, product)}/{package_name}*.src.rpm"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode == 0 and result.stdout.strip():
-            rpm_files.append(result.stdout.strip().split('\n')[0])  # Get the latest version
+        candidates = store_index[product].get(package_name)
+        if not candidates and versioned:
+            name, prefix = versioned
+            candidates = [path for path in store_index[product].get(name, [])
+                          if version_matches(split_rpm_filename(path)[1], prefix)]
+        if candidates:
+            rpm_files.append(candidates[0])  # Get the latest version
 
     return rpm_files
 
@@ -73,47 +112,239 @@ def get_product_rpm(product, store_path, rpm_files):
     return None
 
 def rpm_info(package_path):
-    cmd = f"rpm -qp --qf '%{{name}} %{{version}} %{{release}}' {package_path}"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if result.returncode == 0:
-        parts = result.stdout.strip().split()
-        return (parts[0], parts[1], parts[2])  # Now returns name, version, release
-    else:
+    try:
+        header = rpm_header(package_path)
+    except (OSError, ValueError) as err:
+        print(f"Can not read rpm header of {package_path}: {err}")
         return None
-
-def diff_changelog(package_a, package_b, diff_file):
-    tmpdir = "/tmp"
-    temp_file = os.path.join(tmpdir, f'tmp-chlog-{os.getpid()}')
-
-    cmd = f"rpm -qp --changelog {package_a} > {temp_file} && rpm -qp --changelog {package_b} > {temp_file}b"
-    print(cmd)
-    subprocess.run(cmd, shell=True)
-    cmd = f"diff -sb {temp_file} {temp_file}b > {diff_file}"
-    subprocess.run(cmd, shell=True)
-
-    # Replace bugzilla, fate, jsc links
-    with open(diff_file, 'r') as f:
-        lines = []
-        for line in f:
-            modified_line = line
-            modified_line = re.sub(r'(http://|https://[^ ]+)', r'<a href="\1">\1</a>', modified_line)
-            modified_line = re.sub(r'jsc#([A-Z]+-\d+)', r'<a href="https://jira.suse.com/browse/\1" target="_blank">jsc#\1</a>', modified_line)
-            modified_line = re.sub(r'FATE#(\d+)', r'<a href="https://fate.suse.com/\1">FATE#\1</a>', modified_line)
-            modified_line = re.sub(r'bsc#(\d+)', r'<a href="https://bugzilla.suse.com/show_bug.cgi?id=\1" target="_blank">bsc#\1</a>', modified_line)
-            modified_line = re.sub(r'boo#(\d+)', r'<a href="https://bugzilla.suse.com/show_bug.cgi?id=\1" target="_blank">boo#\1</a>', modified_line)
-            modified_line = re.sub(r'CVE-(\d+-\d+)', r'<a href="https://www.suse.com/security/cve/CVE-\1.html" target="_blank">CVE-\1</a>', modified_line)
-            lines.append(modified_line)
-    
-    with open(diff_file, 'w') as f:
-        f.write("<html><pre>\n")
-        f.writelines(lines)
-        f.write("</pre></html>")
-
-    #os.remove(temp_file)
-    print(temp_file)
-    print(temp_file+"b")
+    return (header.name, header.version, header.release)  # Now returns name, version, release
+
+@functools.lru_cache(maxsize=None)
+def content_key(package_path):
+    """
+    Key identifying the content of a package: the digest of its signature
+    header, or the sha256 of the whole file if it has none
+    """
+    digest = rpm_header(package_path).digest
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    with open(package_path, 'rb') as fil:
+        for data in iter(lambda: fil.read(1 << 20), b""):
+            hasher.update(data)
+    return f"file-sha256:{hasher.hexdigest()}"
+
+# bugzilla, fate, jsc, CVE references and urls, linkified in a single pass
+REFERENCES = re.compile(r'(?P<url>https?://[^\s<>"\']+)'
+                        r'|jsc#(?P<jsc>[A-Z]+-\d+)'
+                        r'|FATE#(?P<fate>\d+)'
+                        r'|bsc#(?P<bsc>\d+)'
+                        r'|boo#(?P<boo>\d+)'
+                        r'|CVE-(?P<cve>\d+-\d+)')
+REFERENCE_LINKS = {
+    'url': '{0}',
+    'jsc': 'https://jira.suse.com/browse/{0}',
+    'fate': 'https://fate.suse.com/{0}',
+    'bsc': 'https://bugzilla.suse.com/show_bug.cgi?id={0}',
+    'boo': 'https://bugzilla.suse.com/show_bug.cgi?id={0}',
+    'cve': 'https://www.suse.com/security/cve/CVE-{0}.html',
+}
+
+def diff_changelog(package_a, package_b):
+    """
+    Unified diff of the changelogs of two packages, ignoring white space changes
+    """
+    # changelogs come from the memoized header read, the diff is done in memory
+    changelog_a = format_changelog(rpm_header(package_a).changelog)
+    changelog_b = format_changelog(rpm_header(package_b).changelog)
+    return unified_diff(changelog_a.splitlines(keepends=True), changelog_b.splitlines(keepends=True),
+                        os.path.basename(package_a), os.path.basename(package_b), ignore_space=True)
+
+def linkify(text):
+    """
+    Escape text for HTML and turn the references it contains into links
+    """
+    out = []
+    position = 0
+    for match in REFERENCES.finditer(text):
+        out.append(html.escape(text[position:match.start()], quote=False))
+        reference = html.escape(match.group())
+        link = REFERENCE_LINKS[match.lastgroup].format(html.escape(match.group(match.lastgroup)))
+        target = '' if match.lastgroup in ('url', 'fate') else ' target="_blank"'
+        out.append(f'<a href="{link}"{target}>{reference}</a>')
+        position = match.end()
+    out.append(html.escape(text[position:], quote=False))
+    return ''.join(out)
+
+def write_changelog_html(diff_text, diff_file):
+    write_atomic(diff_file, "<html><pre>\n" + linkify(diff_text) + "</pre></html>")
     print(diff_file)
-    #exit(1)
+
+def file_inputs(rpm_files):
+    """
+    Path, size and mtime of the rpm files of a row, what decides if it must be rebuilt
+    """
+    inputs = []
+    for rpm in rpm_files:
+        info = os.stat(rpm)
+        inputs.append({'path': rpm, 'size': info.st_size, 'mtime': info.st_mtime_ns})
+    return inputs
+
+def load_manifest(manifest_file):
+    """
+    State of the previous run: {'products': [...], 'rows': {package: row}}
+    """
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'products': PRODUCTS, 'rows': {}}
+    if manifest.get('products') != PRODUCTS:
+        # columns changed, nothing can be reused
+        return {'products': PRODUCTS, 'rows': {}}
+    return manifest
+
+def row_is_current(row, rpm_files):
+    """
+    True if a row from the manifest was built from the same rpm files and all
+    its diff artifacts are still there
+    """
+    if row.get('error') is not None:
+        return False
+    current = [(i['path'], i['size'], i['mtime']) for i in file_inputs(rpm_files)]
+    if current != [(i['path'], i['size'], i['mtime']) for i in row['inputs']]:
+        return False
+    for cell in row['cells']:
+        for pair in cell['pairs'] if cell else []:
+            if not (pair['done'] and pair.get('payload_done')
+                    and os.path.exists(pair['chlog']) and os.path.exists(pair['rpmdiff'])):
+                return False
+    return True
+
+def build_row(package, rpm_files, product_diff):
+    """
+    Collect what is needed for the row of a package: url and summary, version
+    of the rpm of each product and the changelog/rpmdiff pairs to compute.
+    """
+    row = {'package': package, 'found': False, 'url': None, 'summary': None,
+           'cells': [], 'error': None, 'inputs': []}
+    print(f"Processing {package}")
+    with METRICS.phase('headers', package):
+        try:
+            # checksum and NVR of each input are recorded in the manifest
+            row['inputs'] = file_inputs(rpm_files)
+            for entry in row['inputs']:
+                entry['key'] = content_key(entry['path'])
+                entry['nvr'] = rpm_info(entry['path'])
+
+            # Get URL and summary using the first RPM file found
+            if rpm_files:
+                row['found'] = True
+                try:
+                    header = rpm_header(rpm_files[0])
+                    row['url'] = header.url
+                    row['summary'] = header.summary
+                except (OSError, ValueError):
+                    pass
+
+            present = {}
+            for product in PRODUCTS:
+                rpm = get_product_rpm(product, STORE_PATH, rpm_files)
+                if rpm and os.path.exists(rpm):
+                    present[product] = rpm
+
+            for product in PRODUCTS:
+                if product not in present:
+                    row['cells'].append(None)
+                    continue
+                rpm_a = present[product]
+                nameA, versionA, releaseA = rpm_info(rpm_a)
+                cell = {'version': versionA, 'release': releaseA, 'pairs': []}
+                row['cells'].append(cell)
+
+                for other_product in PRODUCTS:
+                    if other_product == product or other_product not in present:
+                        continue  # Skip comparison with itself
+                    rpm_b = present[other_product]
+                    nameB, versionB, releaseB = rpm_info(rpm_b)
+                    cell['pairs'].append({
+                        'other_product': other_product, 'rpm_a': rpm_a, 'rpm_b': rpm_b,
+                        'done': False, 'payload_done': False,
+                        'key_a': content_key(rpm_a), 'key_b': content_key(rpm_b),
+                        'chlog': os.path.join(product_diff, f"chlog_{product}_{nameA}_{versionA}-{releaseA}_VS_{other_product}_{nameB}_{versionB}-{releaseB}.html"),
+                        'rpmdiff': os.path.join(product_diff, f"rpmdiff_{product}_{nameA}_{versionA}-{releaseA}_VS_{other_product}_{nameB}_{versionB}-{releaseB}.txt"),
+                    })
+
+        except Exception as e:
+            print(f"Error processing {package}: {e}")
+            row['error'] = str(e)
+    return row
+
+def compare_pair(rpm_first, rpm_second, cache_base, views):
+    """
+    Changelog diff and full rpmdiff of two rpms, computed once in the canonical
+    orientation and stored in the cache, then written as each requested view:
+    (reverse, rpm_a, rpm_b, changelog file, rpmdiff file).
+    Identical packages are not diffed at all. A payload that can not be read
+    (zstd without python3-zstandard...) does not prevent the changelog diff,
+    its rpmdiff file then tells why it failed.
+    Returns (changelog diffs written, payload diffs written).
+    """
+    chlog_cache = f"{cache_base}.chlog"
+    rpmdiff_cache = f"{cache_base}.rpmdiff"
+    identical = content_key(rpm_first) == content_key(rpm_second)
+    payload_done = True
+    if identical:
+        METRICS.count('identical_pairs')
+        chlog_text = rpmdiff_text = None
+    else:
+        if os.path.exists(chlog_cache):
+            METRICS.count('changelog_cache_hits')
+            with open(chlog_cache, 'r') as f:
+                chlog_text = f.read()
+        else:
+            with METRICS.phase('changelog_diff'):
+                chlog_text = diff_changelog(rpm_first, rpm_second)
+            write_atomic(chlog_cache, chlog_text)
+        if os.path.exists(rpmdiff_cache):
+            METRICS.count('rpmdiff_cache_hits')
+            with open(rpmdiff_cache, 'r') as f:
+                rpmdiff_text = f.read()
+        else:
+            try:
+                with METRICS.phase('srpm_diff', os.path.basename(rpm_first)):
+                    rpmdiff_text = srpm_diff(rpm_first, rpm_second)
+                write_atomic(rpmdiff_cache, rpmdiff_text)
+            except Exception as e:
+                # not cached, the next run tries again
+                print(f"Payload diff of {rpm_first} and {rpm_second} failed: {e}")
+                METRICS.count('payload_diff_errors')
+                rpmdiff_text = f"payload diff failed: {e}\n"
+                payload_done = False
+
+    for reverse, rpm_a, rpm_b, diff_file, full_diff in views:
+        if identical:
+            same = f"Files {os.path.basename(rpm_a)} and {os.path.basename(rpm_b)} are identical\n"
+            view_chlog = view_rpmdiff = same
+        elif reverse:
+            view_chlog = reverse_unified_diff(chlog_text)
+            view_rpmdiff = reverse_unified_diff(rpmdiff_text) if payload_done else rpmdiff_text
+        else:
+            view_chlog = chlog_text
+            view_rpmdiff = rpmdiff_text
+        if not view_chlog:
+            # packages differ but not their changelogs, as 'diff -s' says it
+            view_chlog = f"Changelogs of {os.path.basename(rpm_a)} and {os.path.basename(rpm_b)} are identical\n"
+
+        if os.path.exists(diff_file):
+            print(f"{diff_file} already exist")
+            METRICS.count('views_skipped')
+        else:
+            with METRICS.phase('linkify'):
+                write_changelog_html(view_chlog, diff_file)
+        if not payload_done or not os.path.exists(full_diff):
+            write_atomic(full_diff, view_rpmdiff)
+    return True, payload_done
 
 def main():
     if len(sys.argv) != 3:
@@ -127,164 +358,100 @@ def main():
     product_diff = os.path.join(resultdir, 'diffs')
 
     # Clean and create directories
-    os.makedirs(product_diff, exist_ok=True)
+    os.makedirs(os.path.join(product_diff, 'cache'), exist_ok=True)
 
     packages = get_packages(package_list)
 
-    with open(result, 'w') as f:
-        f.write(f"<html>\n<head><title>Package Comparison ({datetime.now().strftime('%Y/%m/%d %H:%M')})</title></head>\n")
-        f.write("<style>")
-        f.write("th.package-info, td.package-info { width: 250px; }")
-        f.write(".styled-table {\n")
-        f.write("border-collapse: collapse;\n")
-        f.write("margin: 25px 0;\n")
-        f.write("font-size: 0.9em;\n")
-        f.write("font-family: sans-serif;\n")
-        f.write("min-width: 400px;\n")
-        f.write("box-shadow: 0 0 20px rgba(0, 0, 0, 0.15);\n")
-        f.write("}\n")
-        f.write(".styled-table thead tr {\n")
-        f.write("background-color: #009879;\n")
-        f.write("color: #ffffff;\n")
-        f.write("text-align: left;\n")
-        f.write("}\n")
-        f.write(".styled-table th,\n")
-        f.write(".styled-table td {\n")
-        f.write("padding: 12px 15px;\n")
-        f.write("}\n")
-        f.write(".styled-table tbody tr {\n")
-        f.write("border-bottom: 1px solid #dddddd;\n")
-        f.write("}\n")
-        f.write(".styled-table tbody tr:nth-of-type(even) {\n")
-        f.write("background-color: #f3f3f3;\n")
-        f.write("}\n")
-        f.write(".styled-table tbody tr:last-of-type {\n")
-        f.write("border-bottom: 2px solid #009879;\n")
-        f.write("}\n")
-        f.write(".styled-table tbody tr.active-row {\n")
-        f.write("font-weight: bold;\n")
-        f.write("color: #009879;\n")
-        f.write("}\n")
-        f.write("div{")
-        f.write("font-size: 2rem;")
-        f.write("text-align: left;")
-        f.write("height:5vh;")
-        f.write("line-height: 5vh;")
-        f.write("color: #fcedd8;")
-        f.write("background: green;")
-        f.write("font-family: 'Niconne', cursive;")
-        f.write("font-weight: 700;")
-        f.write("}")
-        f.write("</style>")
-        f.write("<div>SRPM Packages versions comparison</div>\n")
-        f.write(f"<p>{date_str}</p>")
-        f.write(f"<p>Based on src.rpm, diff done on {os.uname().machine}</p>\n")
-        f.write("<table class='styled-table'>\n<tr><th class='package-info'></th>")
-
-    for product in PRODUCTS:
-        with open(result, 'a') as f:
-            f.write(f"<th>{product}</th>")
-
-    with open(result, 'a') as f:
-        f.write("</tr>\n<tr>")
-
-    for package in packages:
-        current_pkg = None
-        prev_pkg = None
-        prev_product = None
-        with open(result, 'a') as f:
-                f.write("<tr>")  # Start a new row for each package
-
-        print(f"Processing {package}")
-
-        try:
-            # Find all RPM files for this package
-            rpm_files = find_rpm_files(package, STORE_PATH)
-            print(f"searching {package} | FOUND: {rpm_files}")
-
-            with open(result, 'a') as f:
-                f.write("<td class='package-info' bgcolor='#e5e5e5'>")
-
-            # Get URL and summary using the first RPM file found
-            if rpm_files:
-                sample_rpm = rpm_files[0]
-                url_cmd = f"rpm -qp --qf '%{{url}} %{{summary}}' {sample_rpm}"
-                url_result = subprocess.run(url_cmd, shell=True, capture_output=True, text=True)
-
-                if url_result.returncode == 0:
-                    parts = url_result.stdout.strip().split(maxsplit=1)  # Split only once
-                    url = parts[0] if len(parts) > 0 else ''
-                    summary = parts[1] if len(parts) > 1 else ''
-
-                    with open(result, 'a') as f:
-                        f.write(f"<a href='{url}'>{package}</a><br>{summary}")
-                else:
-                    with open(result, 'a') as f:
-                        f.write(package)
+    # rows whose rpm files did not change since the last run come from the manifest
+    manifest_file = os.path.join(resultdir, 'manifest.json')
+    manifest = load_manifest(manifest_file)
+    rows = [None] * len(packages)
+    todo = []
+    with METRICS.phase('store_index'):
+        store_index = build_store_index(STORE_PATH)
+    for index, package in enumerate(packages):
+        # Find all RPM files for this package
+        rpm_files = find_rpm_files(package, store_index)
+        print(f"searching {package} | FOUND: {rpm_files}")
+        cached = manifest['rows'].get(package)
+        if cached is not None and row_is_current(cached, rpm_files):
+            print(f"{package} unchanged since last run")
+            METRICS.count('rows_reused')
+            rows[index] = cached
+        else:
+            todo.append((index, package, rpm_files))
+    METRICS.count('rows_built', len(todo))
+
+    # header reads of each package, then every changelog/rpmdiff pair, are
+    # spread over a process pool; rows are rendered in the original order.
+    # The metrics of each call in the workers are merged back in METRICS.
+    workers = config.getint('report', 'workers', fallback=0) or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        new_rows = []
+        with METRICS.phase('rows'):
+            for row, snapshot in executor.map(collected, [build_row] * len(todo),
+                                              [package for _, package, _ in todo],
+                                              [rpm_files for _, _, rpm_files in todo],
+                                              [product_diff] * len(todo)):
+                METRICS.merge(snapshot)
+                new_rows.append(row)
+        for (index, _, _), row in zip(todo, new_rows):
+            rows[index] = row
+
+        # each unordered pair of package contents is compared once, the
+        # reversed views and the already computed pairs come from the cache
+        groups = {}
+        for row in new_rows:
+            for cell in row['cells']:
+                for pair in cell['pairs'] if cell else []:
+                    name, reverse = pair_key(pair['key_a'], pair['key_b'])
+                    if name not in groups:
+                        first, second = (pair['rpm_b'], pair['rpm_a']) if reverse else (pair['rpm_a'], pair['rpm_b'])
+                        groups[name] = (first, second, [], [])
+                    groups[name][2].append((reverse, pair['rpm_a'], pair['rpm_b'], pair['chlog'], pair['rpmdiff']))
+                    groups[name][3].append(pair)
+        METRICS.count('pairs', len(groups))
+        futures = []
+        for name, (first, second, views, pairs) in groups.items():
+            cache_base = os.path.join(product_diff, 'cache', name)
+            futures.append((pairs, executor.submit(collected, compare_pair, first, second, cache_base, views)))
+        with METRICS.phase('compare'):
+            for pairs, future in futures:
+                try:
+                    (done, payload_done), snapshot = future.result()
+                    METRICS.merge(snapshot)
+                except Exception as e:
+                    print(f"Error comparing {pairs[0]['rpm_a']} and {pairs[0]['rpm_b']}: {e}")
+                    METRICS.count('compare_errors')
+                    done = payload_done = False
+                for pair in pairs:
+                    pair['done'] = done
+                    pair['payload_done'] = payload_done
+
+    manifest['rows'] = {row['package']: row for row in rows}
+    write_atomic(manifest_file, json.dumps(manifest))
+
+    # the whole report is written at once, in each configured format
+    report = ReportBuilder(PRODUCTS, date_str, os.uname().machine)
+    for row in rows:
+        report.add_row(row)
+    formats = [fmt.strip() for fmt in config.get('report', 'formats', fallback='html').split(',')]
+    with METRICS.phase('report'):
+        for report_format in formats:
+            if report_format == 'html':
+                report.write(result, 'html')
+            elif report_format in ('json', 'csv'):
+                report.write(os.path.join(resultdir, f"index.{report_format}"), report_format)
             else:
-                with open(result, 'a') as f:
-                    f.write(f"{package} (No RPM files found)")
-
-            with open(result, 'a') as f:
-                f.write("</td>\n")
-
-                for product in PRODUCTS:
-                    print(product)
-                    rpm_a = None
-                    PRESENT = False
-
-                    # Find RPM for the current product
-                    rpm_a = get_product_rpm(product, STORE_PATH, rpm_files)
-                    #print("Package current product: ", rpm_a)
-
-                    if rpm_a and os.path.exists(rpm_a):
-                        nameA, versionA, releaseA = rpm_info(rpm_a)
-
-                        with open(result, 'a') as f:
-                            f.write(f"<td align='center'><b>{versionA}-{releaseA}</b>")
-                            PRESENT = True
-
-                        for other_product in PRODUCTS:
-                            if other_product == product:
-                                continue  # Skip comparison with itself
-
-                            rpm_b = get_product_rpm(other_product, STORE_PATH, rpm_files)
-                            #print("Package other product:", rpm_b)
-
-                            if rpm_b and os.path.exists(rpm_b):
-                                nameB, versionB, releaseB = rpm_info(rpm_b)
-                                diff_file = os.path.join(product_diff, f"chlog_{product}_{nameA}_{versionA}-{releaseA}_VS_{other_product}_{nameB}_{versionB}-{releaseB}.html")
-                                if os.path.exists(diff_file):
-                                    print(f"{diff_file} already exist")
-                                else:
-                                    diff_changelog(rpm_a, rpm_b, diff_file)
-
-                                if os.path.exists(diff_file):
-                                    with open(result, 'a') as f:
-                                        f.write(f"<br><a href='diffs/{os.path.basename(diff_file)}' style='color:green;><font size='2'>Chglog Diff {other_product}</font></a>")
-
-                                        full_diff = os.path.join(product_diff, f"rpmdiff_{product}_{nameA}_{versionA}-{releaseA}_VS_{other_product}_{nameB}_{versionB}-{releaseB}.txt")
-                                        if not os.path.exists(full_diff):
-                                            subprocess.run(f"{rpm_diff_cmd} {rpm_a} {rpm_b} > {full_diff}", shell=True)
-                                        f.write(f"<br><a href='diffs/{os.path.basename(full_diff)}' style='color:purple;><font size='2'>Diff {other_product}</font></a>")
-                                else:
-                                    with open(result, 'a') as f:
-                                        f.write("<br><font color='red'>No changelog diff</font>")
-
-                        with open(result, 'a') as f:
-                            f.write("</td>\n")
-
-                    else:
-                        with open(result, 'a') as f:
-                            f.write("<td align='center'><font color='red'>Not present</font></td>\n")
-
-        except Exception as e:
-            print(f"Error processing {package}: {e}")
-            with open(result, 'a') as f:
-                f.write(f"<td align='center' style='background-color: #ffe6e6;'>{str(e)}</td>\n")
-
-    with open(result, 'a') as f:
-        f.write("</tr></table>\n<hr><small><a href='https://github.com/aginies/grab_packages'>Generated by package_compare.py</a></small></html>")
+                print(f"Unknown report format {report_format}")
+
+    # timings and counters of the run, the phases done in the worker processes
+    # are the sum of the time spent by all workers
+    metrics_dir = config.get('metrics', 'path', fallback='metrics')
+    summary = METRICS.write('package_comparison', os.path.join(metrics_dir, 'package_comparison.json'),
+                            config.get('metrics', 'prometheus_dir', fallback=None))
+    print(f"Done in {summary['duration']}s: {len(todo)} rows built, {len(rows) - len(todo)} reused, "
+          f"{summary['counters'].get('pairs', 0)} package pairs, metrics in {metrics_dir}")
 
 if __name__ == "__main__":
     import sys
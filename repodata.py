@@ -0,0 +1,101 @@
+"""
+Helpers to read rpm-md repository metadata (repodata/repomd.xml and primary.xml)
+instead of scraping the HTML directory listing of a repository.
+"""
+import bz2
+import gzip
+import lzma
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+Package = namedtuple('Package', ['name', 'epoch', 'version', 'release', 'arch',
+                                 'size', 'checksum_type', 'checksum', 'location'])
+
+def local_name(tag):
+    """
+    Strip the XML namespace from a tag: '{http://...}package' -> 'package'
+    """
+    return tag.rsplit('}', 1)[-1]
+
+def repo_root(url):
+    """
+    Return the base URL of the repository containing the given path.
+    Source paths in config.ini point to the 'src' arch sub-directory, while
+    repodata/ lives one level up.
+    """
+    url = url.rstrip('/')
+    if url.rsplit('/', 1)[-1] == 'src':
+        url = url.rsplit('/', 1)[0]
+    return url
+
+def parse_repomd(stream):
+    """
+    Parse a repomd.xml stream and return a dict: data type -> (location, checksum_type, checksum)
+    """
+    records = {}
+    for _, elem in ET.iterparse(stream, events=('end',)):
+        if local_name(elem.tag) != 'data':
+            continue
+        location = checksum_type = checksum = None
+        for child in elem:
+            name = local_name(child.tag)
+            if name == 'location':
+                location = child.get('href')
+            elif name == 'checksum':
+                checksum_type = child.get('type')
+                checksum = (child.text or '').strip()
+        records[elem.get('type')] = (location, checksum_type, checksum)
+        elem.clear()
+    return records
+
+def open_compressed(stream, href):
+    """
+    Wrap a binary stream with the decompressor matching the file extension,
+    data is decompressed on the fly while it is read.
+    """
+    if href.endswith('.gz'):
+        return gzip.GzipFile(fileobj=stream)
+    if href.endswith('.xz'):
+        return lzma.LZMAFile(stream)
+    if href.endswith('.bz2'):
+        return bz2.BZ2File(stream)
+    if href.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as err:
+            raise ValueError(f"python3-zstandard is needed to read {href}") from err
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    return stream
+
+def parse_primary(stream):
+    """
+    Incrementally parse a (decompressed) primary.xml stream.
+    Yield a Package for each <package> element, elements are released as soon
+    as they are parsed so memory usage stays flat even on huge repositories.
+    """
+    context = ET.iterparse(stream, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or local_name(elem.tag) != 'package':
+            continue
+        fields = {'name': None, 'epoch': '0', 'version': None, 'release': None,
+                  'arch': None, 'size': None, 'checksum_type': None,
+                  'checksum': None, 'location': None}
+        for child in elem:
+            name = local_name(child.tag)
+            if name in ('name', 'arch'):
+                fields[name] = (child.text or '').strip()
+            elif name == 'version':
+                fields['epoch'] = child.get('epoch', '0')
+                fields['version'] = child.get('ver')
+                fields['release'] = child.get('rel')
+            elif name == 'checksum':
+                fields['checksum_type'] = child.get('type')
+                fields['checksum'] = (child.text or '').strip()
+            elif name == 'size':
+                size = child.get('package')
+                fields['size'] = int(size) if size else None
+            elif name == 'location':
+                fields['location'] = child.get('href')
+        yield Package(**fields)
+        root.clear()
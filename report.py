@@ -0,0 +1,152 @@
+"""
+Report builder of package_comparison.py: rows are collected in memory and the
+whole page is written once, with atomicfile.write_atomic().
+The same data can be written as JSON or CSV for dashboards.
+"""
+import csv
+import io
+import json
+import os
+from atomicfile import write_atomic
+
+HTML_STYLE = """<style>th.package-info, td.package-info { width: 250px; }.styled-table {
+border-collapse: collapse;
+margin: 25px 0;
+font-size: 0.9em;
+font-family: sans-serif;
+min-width: 400px;
+box-shadow: 0 0 20px rgba(0, 0, 0, 0.15);
+}
+.styled-table thead tr {
+background-color: #009879;
+color: #ffffff;
+text-align: left;
+}
+.styled-table th,
+.styled-table td {
+padding: 12px 15px;
+}
+.styled-table tbody tr {
+border-bottom: 1px solid #dddddd;
+}
+.styled-table tbody tr:nth-of-type(even) {
+background-color: #f3f3f3;
+}
+.styled-table tbody tr:last-of-type {
+border-bottom: 2px solid #009879;
+}
+.styled-table tbody tr.active-row {
+font-weight: bold;
+color: #009879;
+}
+div{font-size: 2rem;text-align: left;height:5vh;line-height: 5vh;color: #fcedd8;background: green;font-family: 'Niconne', cursive;font-weight: 700;}</style>"""
+
+def render_row(row):
+    """
+    HTML of the row of a package
+    """
+    package = row['package']
+    html = ["<tr>", "<td class='package-info' bgcolor='#e5e5e5'>"]
+    if not row['found']:
+        html.append(f"{package} (No RPM files found)")
+    elif row['url'] is not None:
+        html.append(f"<a href='{row['url']}'>{package}</a><br>{row['summary']}")
+    else:
+        html.append(package)
+    html.append("</td>\n")
+
+    for cell in row['cells']:
+        if cell is None:
+            html.append("<td align='center'><font color='red'>Not present</font></td>\n")
+            continue
+        html.append(f"<td align='center'><b>{cell['version']}-{cell['release']}</b>")
+        for pair in cell['pairs']:
+            if pair['done']:
+                html.append(f"<br><a href='diffs/{os.path.basename(pair['chlog'])}' style='color:green;><font size='2'>Chglog Diff {pair['other_product']}</font></a>")
+                if pair.get('payload_done', True):
+                    html.append(f"<br><a href='diffs/{os.path.basename(pair['rpmdiff'])}' style='color:purple;><font size='2'>Diff {pair['other_product']}</font></a>")
+                else:
+                    html.append(f"<br><a href='diffs/{os.path.basename(pair['rpmdiff'])}' style='color:red;><font size='2'>Diff {pair['other_product']} failed</font></a>")
+            else:
+                html.append("<br><font color='red'>No changelog diff</font>")
+        html.append("</td>\n")
+
+    if row['error'] is not None:
+        html.append(f"<td align='center' style='background-color: #ffe6e6;'>{row['error']}</td>\n")
+    return ''.join(html)
+
+class ReportBuilder:
+    """
+    Collect the rows of the report, then write it in one go as html, json or csv
+    """
+    def __init__(self, products, date_str, machine):
+        self.products = products
+        self.date_str = date_str
+        self.machine = machine
+        self.rows = []
+
+    def add_row(self, row):
+        self.rows.append(row)
+
+    def html(self):
+        """
+        Generator of the chunks of the HTML page
+        """
+        yield f"<html>\n<head><title>Package Comparison ({self.date_str})</title></head>\n"
+        yield HTML_STYLE
+        yield "<div>SRPM Packages versions comparison</div>\n"
+        yield f"<p>{self.date_str}</p>"
+        yield f"<p>Based on src.rpm, diff done on {self.machine}</p>\n"
+        yield "<table class='styled-table'>\n<tr><th class='package-info'></th>"
+        for product in self.products:
+            yield f"<th>{product}</th>"
+        yield "</tr>\n<tr>"
+        for row in self.rows:
+            yield render_row(row)
+        yield "</tr></table>\n<hr><small><a href='https://github.com/aginies/grab_packages'>Generated by package_compare.py</a></small></html>"
+
+    def records(self):
+        """
+        One record per package and product, with relative links to the diffs
+        """
+        for row in self.rows:
+            for product, cell in zip(self.products, row['cells'] or [None] * len(self.products)):
+                record = {'package': row['package'], 'product': product, 'present': cell is not None,
+                          'version': None, 'release': None, 'url': row['url'],
+                          'summary': row['summary'], 'error': row['error'],
+                          'changelog_diffs': {}, 'diffs': {}}
+                if cell is not None:
+                    record['version'] = cell['version']
+                    record['release'] = cell['release']
+                    for pair in cell['pairs']:
+                        if pair['done']:
+                            record['changelog_diffs'][pair['other_product']] = f"diffs/{os.path.basename(pair['chlog'])}"
+                        if pair['done'] and pair.get('payload_done', True):
+                            record['diffs'][pair['other_product']] = f"diffs/{os.path.basename(pair['rpmdiff'])}"
+                yield record
+
+    def json(self):
+        yield json.dumps({'date': self.date_str, 'machine': self.machine,
+                          'products': self.products, 'packages': list(self.records())}, indent=1)
+
+    def csv(self):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(['package', 'product', 'present', 'version', 'release', 'url', 'summary',
+                         'error', 'changelog_diffs', 'diffs'])
+        yield buf.getvalue()
+        for record in self.records():
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow([record['package'], record['product'], record['present'],
+                             record['version'] or '', record['release'] or '', record['url'] or '',
+                             record['summary'] or '', record['error'] or '',
+                             ' '.join(record['changelog_diffs'].values()),
+                             ' '.join(record['diffs'].values())])
+            yield buf.getvalue()
+
+    def write(self, path, report_format='html'):
+        """
+        Write the report in report_format to path, in one go
+        """
+        write_atomic(path, getattr(self, report_format)())
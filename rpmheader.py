@@ -0,0 +1,195 @@
+"""
+Native reader of the RPM file format: lead, signature header and main header
+are parsed once per file, without spawning rpm. The payload is not read.
+"""
+import functools
+import struct
+import time
+from collections import namedtuple
+
+LEAD_MAGIC = b'\xed\xab\xee\xdb'
+HEADER_MAGIC = b'\x8e\xad\xe8\x01'
+LEAD_SIZE = 96
+
+# tag data types
+RPM_INT8_TYPE = 2
+RPM_INT16_TYPE = 3
+RPM_INT32_TYPE = 4
+RPM_INT64_TYPE = 5
+RPM_STRING_TYPE = 6
+RPM_BIN_TYPE = 7
+RPM_STRING_ARRAY_TYPE = 8
+RPM_I18NSTRING_TYPE = 9
+
+# header tags
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_EPOCH = 1003
+RPMTAG_SUMMARY = 1004
+RPMTAG_URL = 1020
+RPMTAG_CHANGELOGTIME = 1080
+RPMTAG_CHANGELOGNAME = 1081
+RPMTAG_CHANGELOGTEXT = 1082
+RPMTAG_OLDFILENAMES = 1027
+RPMTAG_FILESIZES = 1028
+RPMTAG_FILEMODES = 1030
+RPMTAG_FILEDIGESTS = 1035
+RPMTAG_DIRINDEXES = 1116
+RPMTAG_BASENAMES = 1117
+RPMTAG_DIRNAMES = 1118
+RPMTAG_LONGFILESIZES = 5008
+RPMTAG_FILEDIGESTALGO = 5011
+
+# FILEDIGESTALGO values
+DIGEST_ALGOS = {1: 'md5', 2: 'sha1', 8: 'sha256', 9: 'sha384', 10: 'sha512'}
+
+# signature tags
+RPMSIGTAG_SHA1 = 269
+RPMSIGTAG_SHA256 = 273
+RPMSIGTAG_MD5 = 1004
+
+HeaderInfo = namedtuple('HeaderInfo', ['name', 'epoch', 'version', 'release', 'url',
+                                       'summary', 'changelog', 'digest', 'files',
+                                       'digest_algo'])
+# one entry of HeaderInfo.files, digest is '' if the header has none for this file
+FileInfo = namedtuple('FileInfo', ['name', 'size', 'mode', 'digest'])
+
+def parse_header_data(index, store):
+    """
+    Decode the index entries of a header structure: returns a dict tag -> value
+    """
+    tags = {}
+    for tag, data_type, offset, count in index:
+        if data_type == RPM_STRING_TYPE:
+            value = store[offset:store.index(b'\0', offset)].decode('utf-8', 'replace')
+        elif data_type in (RPM_STRING_ARRAY_TYPE, RPM_I18NSTRING_TYPE):
+            value = []
+            for _ in range(count):
+                end = store.index(b'\0', offset)
+                value.append(store[offset:end].decode('utf-8', 'replace'))
+                offset = end + 1
+        elif data_type == RPM_INT32_TYPE:
+            value = list(struct.unpack_from(f'>{count}I', store, offset))
+        elif data_type == RPM_INT16_TYPE:
+            value = list(struct.unpack_from(f'>{count}H', store, offset))
+        elif data_type == RPM_INT64_TYPE:
+            value = list(struct.unpack_from(f'>{count}Q', store, offset))
+        elif data_type == RPM_INT8_TYPE:
+            value = list(store[offset:offset + count])
+        elif data_type == RPM_BIN_TYPE:
+            value = store[offset:offset + count]
+        else:
+            continue
+        tags[tag] = value
+    return tags
+
+def read_header_structure(fil):
+    """
+    Read one header structure (signature or main header) from fil.
+    Returns (tags, size in bytes).
+    """
+    intro = fil.read(16)
+    if len(intro) != 16 or intro[:4] != HEADER_MAGIC:
+        raise ValueError("bad header magic")
+    nindex, hsize = struct.unpack('>II', intro[8:16])
+    raw_index = fil.read(16 * nindex)
+    store = fil.read(hsize)
+    if len(raw_index) != 16 * nindex or len(store) != hsize:
+        raise ValueError("truncated header")
+    index = struct.iter_unpack('>iIiI', raw_index)
+    return parse_header_data(index, store), 16 + 16 * nindex + hsize
+
+def read_headers(fil):
+    """
+    Read the lead, the signature and the main header of an opened rpm file.
+    The file is left positioned at the start of the payload.
+    Returns (signature tags, header tags).
+    """
+    lead = fil.read(LEAD_SIZE)
+    if len(lead) != LEAD_SIZE or lead[:4] != LEAD_MAGIC:
+        raise ValueError("not an rpm file")
+    signature, size = read_header_structure(fil)
+    # the signature is padded to a multiple of 8 bytes
+    fil.read((8 - size % 8) % 8)
+    header, _ = read_header_structure(fil)
+    return signature, header
+
+def first(tags, tag, default=''):
+    """
+    First value of a tag, for string, i18n string and number tags
+    """
+    value = tags.get(tag)
+    if value is None:
+        return default
+    if isinstance(value, list):
+        return value[0] if value else default
+    return value
+
+@functools.lru_cache(maxsize=None)
+def rpm_header(package_path):
+    """
+    Parse the headers of package_path once and return a HeaderInfo.
+    Results are memoized for the whole run.
+    """
+    with open(package_path, 'rb') as fil:
+        signature, tags = read_headers(fil)
+    changelog = list(zip(tags.get(RPMTAG_CHANGELOGTIME, []),
+                         tags.get(RPMTAG_CHANGELOGNAME, []),
+                         tags.get(RPMTAG_CHANGELOGTEXT, [])))
+    return HeaderInfo(first(tags, RPMTAG_NAME), first(tags, RPMTAG_EPOCH, None),
+                      first(tags, RPMTAG_VERSION), first(tags, RPMTAG_RELEASE),
+                      first(tags, RPMTAG_URL), first(tags, RPMTAG_SUMMARY), changelog,
+                      signature_digest(signature), file_list(tags),
+                      DIGEST_ALGOS.get(first(tags, RPMTAG_FILEDIGESTALGO, 1), 'md5'))
+
+def file_list(tags):
+    """
+    Files of the package, in header order, as FileInfo with names relative to /
+    """
+    if RPMTAG_BASENAMES in tags:
+        dirnames = tags.get(RPMTAG_DIRNAMES, [])
+        names = [dirnames[index] + basename for index, basename
+                 in zip(tags.get(RPMTAG_DIRINDEXES, []), tags[RPMTAG_BASENAMES])]
+    else:
+        names = tags.get(RPMTAG_OLDFILENAMES, [])
+    sizes = tags.get(RPMTAG_LONGFILESIZES) or tags.get(RPMTAG_FILESIZES, [])
+    modes = tags.get(RPMTAG_FILEMODES, [])
+    digests = tags.get(RPMTAG_FILEDIGESTS, [])
+    files = []
+    for i, name in enumerate(names):
+        files.append(FileInfo(normalize_path(name), sizes[i] if i < len(sizes) else 0,
+                              modes[i] if i < len(modes) else 0,
+                              digests[i] if i < len(digests) else ''))
+    return files
+
+def normalize_path(name):
+    """
+    'qemu.spec', './qemu.spec' and '/qemu.spec' are the same file
+    """
+    if name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
+
+def signature_digest(signature):
+    """
+    Digest identifying the content of the package, from the signature header:
+    'sha256:<hex>', 'sha1:<hex>', 'md5:<hex>' or None
+    """
+    if RPMSIGTAG_SHA256 in signature:
+        return f"sha256:{signature[RPMSIGTAG_SHA256]}"
+    if RPMSIGTAG_SHA1 in signature:
+        return f"sha1:{signature[RPMSIGTAG_SHA1]}"
+    if RPMSIGTAG_MD5 in signature:
+        return f"md5:{signature[RPMSIGTAG_MD5].hex()}"
+    return None
+
+def format_changelog(changelog):
+    """
+    Format changelog entries like 'rpm -qp --changelog' does
+    """
+    lines = []
+    for entry_time, name, text in changelog:
+        day = time.strftime('%a %b %d %Y', time.localtime(entry_time))
+        lines.append(f"* {day} {name}\n{text}\n\n")
+    return ''.join(lines)
@@ -0,0 +1,149 @@
+"""
+RPM version comparison with the semantics of rpm's rpmvercmp():
+alphanumeric segments, numeric segments compared as numbers, '~' sorts
+before anything (pre-releases), '^' sorts after the base version (snapshots).
+version_key()/evr_key() give cached sort keys with the same ordering, for
+sorting and max() without calling the comparison for each pair.
+"""
+import functools
+
+def is_alnum(char):
+    return char.isascii() and char.isalnum()
+
+def is_digit(char):
+    return '0' <= char <= '9'
+
+def is_alpha(char):
+    return char.isascii() and char.isalpha()
+
+def rpmvercmp(one, two):
+    """
+    Compare two version (or release) strings: returns -1, 0 or 1
+    """
+    if one == two:
+        return 0
+    i = j = 0
+    len_one, len_two = len(one), len(two)
+    while i < len_one or j < len_two:
+        while i < len_one and not is_alnum(one[i]) and one[i] not in '~^':
+            i += 1
+        while j < len_two and not is_alnum(two[j]) and two[j] not in '~^':
+            j += 1
+
+        # '~' sorts before everything, even the end of the string
+        tilde_one = i < len_one and one[i] == '~'
+        tilde_two = j < len_two and two[j] == '~'
+        if tilde_one or tilde_two:
+            if not tilde_one:
+                return 1
+            if not tilde_two:
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        # '^' sorts after the end of the string, but before anything else
+        caret_one = i < len_one and one[i] == '^'
+        caret_two = j < len_two and two[j] == '^'
+        if caret_one or caret_two:
+            if i >= len_one:
+                return -1
+            if j >= len_two:
+                return 1
+            if not caret_one:
+                return 1
+            if not caret_two:
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        if i >= len_one or j >= len_two:
+            break
+
+        start_one, start_two = i, j
+        if is_digit(one[i]):
+            while i < len_one and is_digit(one[i]):
+                i += 1
+            while j < len_two and is_digit(two[j]):
+                j += 1
+            numeric = True
+        else:
+            while i < len_one and is_alpha(one[i]):
+                i += 1
+            while j < len_two and is_alpha(two[j]):
+                j += 1
+            numeric = False
+        segment_one = one[start_one:i]
+        segment_two = two[start_two:j]
+
+        # a numeric segment is newer than an alpha one
+        if not segment_two:
+            return 1 if numeric else -1
+
+        if numeric:
+            segment_one = segment_one.lstrip('0')
+            segment_two = segment_two.lstrip('0')
+            if len(segment_one) != len(segment_two):
+                return 1 if len(segment_one) > len(segment_two) else -1
+        if segment_one != segment_two:
+            return 1 if segment_one > segment_two else -1
+
+    if i >= len_one and j >= len_two:
+        return 0
+    # the version with characters left wins
+    return -1 if i >= len_one else 1
+
+def evr_cmp(evr_one, evr_two):
+    """
+    Compare two (epoch, version, release) tuples, a missing epoch is 0
+    """
+    epoch_one = int(evr_one[0] or 0)
+    epoch_two = int(evr_two[0] or 0)
+    if epoch_one != epoch_two:
+        return 1 if epoch_one > epoch_two else -1
+    result = rpmvercmp(evr_one[1], evr_two[1])
+    if result:
+        return result
+    return rpmvercmp(evr_one[2], evr_two[2])
+
+# ranks of the elements of a sort key, in rpmvercmp order
+TILDE, END, CARET, ALPHA, NUMERIC = range(5)
+
+@functools.lru_cache(maxsize=None)
+def version_key(version):
+    """
+    Sort key of a version string: comparing two keys gives the same result as
+    rpmvercmp() on the strings, without re-parsing them at each comparison
+    """
+    key = []
+    i = 0
+    length = len(version)
+    while i < length:
+        char = version[i]
+        if char == '~':
+            key.append((TILDE, ''))
+            i += 1
+        elif char == '^':
+            key.append((CARET, ''))
+            i += 1
+        elif is_digit(char):
+            start = i
+            while i < length and is_digit(version[i]):
+                i += 1
+            key.append((NUMERIC, int(version[start:i])))
+        elif is_alpha(char):
+            start = i
+            while i < length and is_alpha(version[i]):
+                i += 1
+            key.append((ALPHA, version[start:i]))
+        else:
+            i += 1
+    key.append((END, ''))
+    return tuple(key)
+
+def evr_key(epoch, version, release):
+    """
+    Sort key of an (epoch, version, release), a missing epoch is 0
+    """
+    return (int(epoch or 0), version_key(version), version_key(release))
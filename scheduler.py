@@ -0,0 +1,150 @@
+"""
+Run-wide download scheduler: listing fetches of all products feed one bounded
+queue, consumed by a fixed pool of download workers. Per host slots cap the
+number of parallel requests against one server and the rate at which they are
+started, and an url requested by several products is downloaded only once,
+as is a package with the same checksum in the metadata of several products.
+"""
+import os
+import queue
+import threading
+import time
+import urllib.parse
+from blobstore import link_file
+
+class HostSlot:
+    """
+    Context manager holding one request slot of a host
+    """
+    def __init__(self, slots, host, semaphore):
+        self.slots = slots
+        self.host = host
+        self.semaphore = semaphore
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        self.slots.throttle(self.host)
+        return self
+
+    def __exit__(self, *args):
+        self.semaphore.release()
+
+class HostSlots:
+    """
+    Per host limits: at most per_host parallel requests, and if rate is set,
+    at most rate requests started per second
+    """
+    def __init__(self, per_host, rate=0):
+        self.per_host = per_host
+        self.rate = rate
+        self.semaphores = {}
+        # host -> time at which the next request may start
+        self.next_start = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return HostSlot(self, host, self.semaphores[host])
+
+    def throttle(self, host):
+        """
+        Wait until a new request to host may start
+        """
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + 1 / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+def job_keys(url, package):
+    """
+    Keys a download is known by: its url, and its checksum if the repository
+    metadata gives one (urls of the same package differ between products)
+    """
+    if package is not None and package.checksum:
+        return [url, (package.checksum_type, package.checksum)]
+    return [url]
+
+class DownloadScheduler:
+    """
+    download(url, file_path, worker_id, package, group) is called by the
+    workers for each distinct url and package checksum, the other requested
+    paths are then linked to the result.
+    download takes the host slot of each request it sends.
+    """
+    def __init__(self, download, workers=5, queue_size=100):
+        self.download = download
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        # url or checksum -> extra file paths waiting for the download, the
+        # url and the checksum of one download share the same list
+        self.pending = {}
+        # url or checksum -> file path of the completed download
+        self.done = {}
+        # every file path already requested, two urls must never write the same file
+        self.targets = set()
+        self.threads = [threading.Thread(target=self.worker, args=(worker_id,), daemon=True)
+                        for worker_id in range(1, workers + 1)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, url, file_path, package=None, group=None):
+        """
+        Queue the download of url to file_path from the mirrors in group,
+        blocks if the queue is full.
+        Returns False if the url, the checksum of package or the file path is
+        already scheduled or downloaded.
+        """
+        keys = job_keys(url, package)
+        with self.lock:
+            if file_path in self.targets:
+                return False
+            self.targets.add(file_path)
+            for key in keys:
+                if key in self.done:
+                    link_file(self.done[key], file_path)
+                    return False
+                if key in self.pending:
+                    self.pending[key].append(file_path)
+                    return False
+            extra_paths = []
+            for key in keys:
+                self.pending[key] = extra_paths
+        self.queue.put((url, file_path, package, group))
+        return True
+
+    def worker(self, worker_id):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            url, file_path, package, group = job
+            try:
+                self.download(url, file_path, worker_id, package, group)
+            finally:
+                with self.lock:
+                    keys = job_keys(url, package)
+                    extra_paths = self.pending.pop(keys[0], [])
+                    for key in keys[1:]:
+                        self.pending.pop(key, None)
+                    if os.path.exists(file_path):
+                        for key in keys:
+                            self.done[key] = file_path
+                        for extra_path in extra_paths:
+                            link_file(file_path, extra_path)
+                self.queue.task_done()
+
+    def join(self):
+        """
+        Wait for all the queued downloads and stop the workers
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
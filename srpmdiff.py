@@ -0,0 +1,200 @@
+"""
+In-process diff of two SRPMs, replacing 'rpmdiff' (rpm2cpio | cpio + diff -uNr).
+The file lists and per-file digests of both headers tell which members changed,
+then each cpio payload is streamed once in memory: identical members are
+skipped, changed text members (spec, changes, patches...) give a unified diff
+and changed binary members (tarballs...) a single summary line.
+Nothing is extracted on disk.
+"""
+import bz2
+import difflib
+import gzip
+import hashlib
+import lzma
+import stat
+from rpmheader import read_headers, rpm_header, normalize_path
+
+# members bigger than this are never diffed line by line
+TEXT_MAX_SIZE = 4 * 1024 * 1024
+# archives are always binary, no need to read them to find out
+BINARY_SUFFIXES = ('.tar', '.tgz', '.tbz2', '.txz', '.gz', '.bz2', '.xz', '.zst', '.lz',
+                   '.zip', '.jar', '.rpm', '.obscpio', '.gem', '.whl', '.png', '.jpg',
+                   '.ico', '.pdf', '.sig', '.asc', '.keyring')
+
+def open_payload(fil):
+    """
+    Wrap the payload of an rpm file (positioned after the headers) with the
+    decompressor matching its magic
+    """
+    magic = fil.peek(6)[:6] if hasattr(fil, 'peek') else b''
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.GzipFile(fileobj=fil)
+    if magic.startswith(b'\xfd7zXZ'):
+        return lzma.LZMAFile(fil)
+    if magic.startswith(b'BZh'):
+        return bz2.BZ2File(fil)
+    if magic.startswith(b'\x28\xb5\x2f\xfd'):
+        try:
+            import zstandard
+        except ImportError as err:
+            raise ValueError("python3-zstandard is needed to read zstd payloads") from err
+        return zstandard.ZstdDecompressor().stream_reader(fil)
+    if magic.startswith(b'\x5d\x00\x00'):
+        return lzma.LZMAFile(fil, format=lzma.FORMAT_ALONE)
+    return fil
+
+class CpioReader:
+    """
+    Sequential reader of a newc (070701/070702) or rpm stripped (07070X) cpio stream
+    """
+    def __init__(self, stream, files):
+        self.stream = stream
+        self.files = files
+        self.offset = 0
+
+    def read(self, size):
+        data = self.stream.read(size)
+        while len(data) < size:
+            more = self.stream.read(size - len(data))
+            if not more:
+                raise ValueError("truncated cpio payload")
+            data += more
+        self.offset += size
+        return data
+
+    def skip(self, size, hasher=None):
+        while size > 0:
+            data = self.read(min(size, 1 << 20))
+            if hasher:
+                hasher.update(data)
+            size -= len(data)
+
+    def align(self):
+        self.read((4 - self.offset % 4) % 4)
+
+    def members(self, wanted, hashed):
+        """
+        Yield (name, data, digest) for each member: data is the content for names
+        in wanted and None otherwise, digest the sha256 for names in hashed
+        """
+        while True:
+            magic = self.read(6)
+            if magic == b'07070X':
+                index = int(self.read(8), 16)
+                # the 14 bytes header is padded to 16
+                self.align()
+                info = self.files[index]
+                name, size, mode = info.name, info.size, info.mode
+            elif magic in (b'070701', b'070702'):
+                fields = self.read(104)
+                mode = int(fields[8:16], 16)
+                size = int(fields[48:56], 16)
+                namesize = int(fields[88:96], 16)
+                name = self.read(namesize)[:-1].decode('utf-8', 'replace')
+                self.align()
+                if name == 'TRAILER!!!':
+                    return
+                name = normalize_path(name)
+            else:
+                raise ValueError(f"unknown cpio magic {magic!r}")
+            if not stat.S_ISREG(mode):
+                self.skip(size)
+                self.align()
+                continue
+            data = digest = None
+            if name in wanted:
+                data = self.read(size)
+                if name in hashed:
+                    digest = hashlib.sha256(data).hexdigest()
+            elif name in hashed:
+                hasher = hashlib.sha256()
+                self.skip(size, hasher)
+                digest = hasher.hexdigest()
+            else:
+                self.skip(size)
+            self.align()
+            yield name, data, digest
+            if magic == b'07070X' and index == len(self.files) - 1:
+                return
+
+def scan_payload(package_path, wanted, hashed):
+    """
+    Stream the payload of package_path once: returns ({name: content} for
+    names in wanted, {name: sha256} for names in hashed)
+    """
+    contents = {}
+    digests = {}
+    if not wanted and not hashed:
+        return contents, digests
+    with open(package_path, 'rb') as fil:
+        read_headers(fil)
+        reader = CpioReader(open_payload(fil), rpm_header(package_path).files)
+        for name, data, digest in reader.members(wanted, hashed):
+            if data is not None:
+                contents[name] = data
+            if digest is not None:
+                digests[name] = digest
+            if len(contents) == len(wanted) and len(digests) == len(hashed):
+                break
+    return contents, digests
+
+def may_be_text(info):
+    return info.size <= TEXT_MAX_SIZE and not info.name.lower().endswith(BINARY_SUFFIXES)
+
+def is_text(data):
+    return b'\0' not in data[:8192]
+
+def srpm_diff(package_a, package_b):
+    """
+    Diff of the content of two rpms, in 'diff -uNr' format
+    """
+    header_a = rpm_header(package_a)
+    header_b = rpm_header(package_b)
+    files_a = {info.name: info for info in header_a.files if stat.S_ISREG(info.mode) or not info.mode}
+    files_b = {info.name: info for info in header_b.files if stat.S_ISREG(info.mode) or not info.mode}
+    same_algo = header_a.digest_algo == header_b.digest_algo
+
+    changed = []
+    unknown = set()
+    for name in sorted(files_a.keys() | files_b.keys()):
+        info_a = files_a.get(name)
+        info_b = files_b.get(name)
+        if info_a and info_b:
+            if same_algo and info_a.digest and info_b.digest:
+                if info_a.digest == info_b.digest:
+                    continue
+            elif info_a.size == info_b.size:
+                # no comparable digest: the payloads must be hashed
+                unknown.add(name)
+        changed.append(name)
+
+    wanted_a = {name for name in changed if name in files_a and may_be_text(files_a[name])}
+    wanted_b = {name for name in changed if name in files_b and may_be_text(files_b[name])}
+    contents_a, digests_a = scan_payload(package_a, wanted_a, unknown)
+    contents_b, digests_b = scan_payload(package_b, wanted_b, unknown)
+
+    label_a = package_a.rsplit('/', 1)[-1]
+    label_b = package_b.rsplit('/', 1)[-1]
+    common = files_a.keys() & files_b.keys()
+    skipped = len(common) - len([name for name in changed if name in common])
+    output = []
+    for name in changed:
+        if name in unknown and digests_a.get(name) == digests_b.get(name):
+            skipped += 1
+            continue
+        path_a = f"{label_a}/{name}"
+        path_b = f"{label_b}/{name}"
+        data_a = contents_a.get(name, b'') if name in files_a else b''
+        data_b = contents_b.get(name, b'') if name in files_b else b''
+        text = ((name not in files_a or name in contents_a) and (name not in files_b or name in contents_b)
+                and is_text(data_a) and is_text(data_b))
+        output.append(f"diff -uNr {path_a} {path_b}\n")
+        if not text:
+            output.append(f"Binary files {path_a} and {path_b} differ\n")
+            continue
+        lines_a = data_a.decode('utf-8', 'replace').splitlines(keepends=True)
+        lines_b = data_b.decode('utf-8', 'replace').splitlines(keepends=True)
+        for line in difflib.unified_diff(lines_a, lines_b, path_a, path_b):
+            output.append(line if line.endswith('\n') else line + '\n\\ No newline at end of file\n')
+    output.insert(0, f"{skipped} identical files skipped\n")
+    return ''.join(output)
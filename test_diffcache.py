@@ -0,0 +1,57 @@
+"""
+reverse_unified_diff() of diffs made by unified_diff(), and of srpm_diff style
+output
+"""
+import pytest
+
+from diffcache import reverse_unified_diff, unified_diff
+
+def lines(text):
+    return text.splitlines(keepends=True)
+
+PAIRS = [
+    # changelog grown at the top
+    ("c\nb\na\n", "e\nd\nc\nb\na\n"),
+    # line changed in the middle
+    ("1\n2\n3\n4\n5\n6\n7\n", "1\n2\n3\nfour\n5\n6\n7\n"),
+    # lines removed
+    ("1\n2\n3\n4\n5\n", "1\n5\n"),
+    # two hunks
+    ("".join(f"{i}\n" for i in range(30)), "".join(f"{i}\n" for i in range(30) if i not in (3, 25)) + "end\n"),
+    # from and to an empty file
+    ("", "a\nb\n"),
+    # last line without newline
+    ("a\nb", "a\nc"),
+    ("a\nb", "a\nb\n"),
+]
+
+@pytest.mark.parametrize("text_a, text_b", PAIRS)
+def test_reverse_unified_diff(text_a, text_b):
+    forward = unified_diff(lines(text_a), lines(text_b), 'a/file', 'b/file')
+    backward = unified_diff(lines(text_b), lines(text_a), 'b/file', 'a/file')
+    assert reverse_unified_diff(forward) == backward
+    assert reverse_unified_diff(backward) == forward
+
+def test_reverse_srpm_diff():
+    forward = ("2 identical files skipped\n"
+               "diff -uNr foo-1.src.rpm/foo.spec foo-2.src.rpm/foo.spec\n"
+               "--- foo-1.src.rpm/foo.spec\n"
+               "+++ foo-2.src.rpm/foo.spec\n"
+               "@@ -1,2 +1,2 @@ Name: foo\n"
+               " Name: foo\n"
+               "-Version: 1\n"
+               "+Version: 2\n"
+               "diff -uNr foo-1.src.rpm/foo-1.tar.xz foo-2.src.rpm/foo-1.tar.xz\n"
+               "Binary files foo-1.src.rpm/foo-1.tar.xz and foo-2.src.rpm/foo-1.tar.xz differ\n")
+    backward = ("2 identical files skipped\n"
+                "diff -uNr foo-2.src.rpm/foo.spec foo-1.src.rpm/foo.spec\n"
+                "--- foo-2.src.rpm/foo.spec\n"
+                "+++ foo-1.src.rpm/foo.spec\n"
+                "@@ -1,2 +1,2 @@ Name: foo\n"
+                " Name: foo\n"
+                "-Version: 2\n"
+                "+Version: 1\n"
+                "diff -uNr foo-2.src.rpm/foo-1.tar.xz foo-1.src.rpm/foo-1.tar.xz\n"
+                "Binary files foo-2.src.rpm/foo-1.tar.xz and foo-1.src.rpm/foo-1.tar.xz differ\n")
+    assert reverse_unified_diff(forward) == backward
+    assert reverse_unified_diff(backward) == forward
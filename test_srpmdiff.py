@@ -0,0 +1,62 @@
+"""
+srpm_diff() of SRPMs with a newc and an rpm stripped cpio payload
+"""
+import pytest
+
+from benchmark import cpio_newc, cpio_stripped, make_srpm
+from srpmdiff import srpm_diff
+
+CHANGELOG = [(1700000000, 'Joe <joe@example.org>', '- update')]
+
+FILES_A = {
+    'foo.spec': b'Name: foo\nVersion: 1\n',
+    'same.patch': b'unchanged\n',
+    'foo-1.tar.gz': b'\x1f\x8b\x08\0version 1',
+    'old.patch': b'old\n',
+}
+FILES_B = {
+    'foo.spec': b'Name: foo\nVersion: 2\n',
+    'same.patch': b'unchanged\n',
+    'foo-1.tar.gz': b'\x1f\x8b\x08\0version 2 is longer',
+    'new.patch': b'new\nno newline',
+}
+
+EXPECTED = """1 identical files skipped
+diff -uNr a.src.rpm/foo-1.tar.gz b.src.rpm/foo-1.tar.gz
+Binary files a.src.rpm/foo-1.tar.gz and b.src.rpm/foo-1.tar.gz differ
+diff -uNr a.src.rpm/foo.spec b.src.rpm/foo.spec
+--- a.src.rpm/foo.spec
++++ b.src.rpm/foo.spec
+@@ -1,2 +1,2 @@
+ Name: foo
+-Version: 1
++Version: 2
+diff -uNr a.src.rpm/new.patch b.src.rpm/new.patch
+--- a.src.rpm/new.patch
++++ b.src.rpm/new.patch
+@@ -0,0 +1,2 @@
++new
++no newline
+\\ No newline at end of file
+diff -uNr a.src.rpm/old.patch b.src.rpm/old.patch
+--- a.src.rpm/old.patch
++++ b.src.rpm/old.patch
+@@ -1 +0,0 @@
+-old
+"""
+
+@pytest.mark.parametrize("cpio", [cpio_newc, cpio_stripped])
+def test_srpm_diff(tmp_path, cpio):
+    package_a = str(tmp_path / 'a.src.rpm')
+    package_b = str(tmp_path / 'b.src.rpm')
+    make_srpm(package_a, 'foo', '1', '1', FILES_A, CHANGELOG, cpio)
+    make_srpm(package_b, 'foo', '2', '1', FILES_B, CHANGELOG, cpio)
+    assert srpm_diff(package_a, package_b) == EXPECTED
+
+@pytest.mark.parametrize("cpio", [cpio_newc, cpio_stripped])
+def test_srpm_diff_identical(tmp_path, cpio):
+    package_a = str(tmp_path / 'a.src.rpm')
+    package_b = str(tmp_path / 'b.src.rpm')
+    make_srpm(package_a, 'foo', '1', '1', FILES_A, CHANGELOG, cpio)
+    make_srpm(package_b, 'foo', '1', '2', FILES_A, CHANGELOG, cpio)
+    assert srpm_diff(package_a, package_b) == "4 identical files skipped\n"